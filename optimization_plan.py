@@ -9,12 +9,13 @@ from src.optimizer import HeatpumpOptimizer
 from src.load_watcher import LoadWatcher
 from src.device_verifier import DeviceVerifier
 from src.devices import Devices
-from src.optimization import EvSolarChargeController
+from src.optimization import EvSolarChargeController, HAVE_NUMBA
 from src.devices_config import devices_config
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR
-from src.forecasting import StatisticsLoader, Weather, Prediction, HAEnergyDashboardFetcher, PriceHistoryManager
+from src.forecasting import HAEnergyDashboardFetcher
 from src.config import CONFIG
+from src.utils import HAVE_ORJSON
 
 # Configure logging with both file and console output
 log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -49,19 +50,15 @@ async def main():
     parser.add_argument('--token', required=True, help='Home Assistant Long-Lived Access Token')
     args = parser.parse_args()
 
-
-    # --- Run prediction at addon start (inlined) ---
-    statistics_loader = StatisticsLoader(args.token)
-    weather = Weather(args.token)
-    
-    # Initialize price history manager if ENTSO-E API is configured
-    entsoe_token = CONFIG['options'].get('entsoe_api_token', '')
-    entsoe_country = CONFIG['options'].get('entsoe_country_code', 'BE')
-    price_history_manager = PriceHistoryManager(entsoe_token, entsoe_country) if entsoe_token else None
-    
-    prediction = Prediction(statistics_loader, weather, price_history_manager)
-    await prediction.calculatePowerUsage()
-    await prediction.calculateSolarProduction()
+    # Numba and orjson are optional installs, so report which backends are active
+    if HAVE_NUMBA:
+        logger.info("⚙️ Optimization kernels: Numba JIT")
+    else:
+        logger.warning("⚠️ Optimization kernels: plain Python (Numba not installed)")
+    if HAVE_ORJSON:
+        logger.info("⚙️ JSON backend: orjson")
+    else:
+        logger.warning("⚠️ JSON backend: json module (orjson not installed)")
 
     # Create APScheduler instance
     scheduler = AsyncIOScheduler()
@@ -71,12 +68,19 @@ async def main():
     # logger.info(args.HAUrl + "----" + args.token)
     optimizer = HeatpumpOptimizer(args.token, scheduler=scheduler)
 
+    # --- Run prediction at addon start ---
+    # Uses the optimizer's predictor, so run_optimization reuses the fitted models while
+    # the training data is unchanged
+    prediction = optimizer._get_predictor()
+    await prediction.calculatePowerUsage()
+    await prediction.calculateSolarProduction()
+
     # Create device verifier and link it to devices
     device_verifier = DeviceVerifier(optimizer.devices, scheduler)
     Devices.set_verifier(device_verifier)
 
-    # Create load watcher instance
-    load_watcher = LoadWatcher(args.token)
+    # Create load watcher instance (shares the optimizer's HA client, closed with the optimizer)
+    load_watcher = LoadWatcher(args.token, ha_client=optimizer.ha_client)
 
     # Create solar charge controller (shares the optimizer's HA client and Devices instance)
     solar_charge_controller = EvSolarChargeController(
@@ -235,6 +239,7 @@ async def main():
         load_watcher.close()
         _solar_db.close()
         scheduler.shutdown(wait=False)
+        await optimizer.close()
 
 if __name__ == "__main__":
     try:
@@ -1,32 +1,55 @@
 """Device State Manager.
 
-Manages device state persistence using TinyDB for tracking:
+Manages device state persistence in the SQLite state store for tracking:
 - Last run times (for gap calculations in optimization)
 - Locked/scheduled starts (for rescheduling protection)
 
-This module handles all TinyDB operations related to device state,
+This module handles all state store operations related to device state,
 keeping the optimizer focused on orchestration logic.
 """
 import logging
+import os
 from datetime import datetime, timedelta
-from tinydb import TinyDB, Query
+
+from tinydb import TinyDB, where
+
+from .json_storage import FastJSONStorage
+from .state_store import StateStore
 
 logger = logging.getLogger(__name__)
 
+ONE_MINUTE = timedelta(minutes=1)
+
 
 class DeviceStateManager:
-    """Manages device state persistence in TinyDB."""
+    """Manages device state persistence in the state store."""
 
-    def __init__(self, db_path: str = 'db.json'):
+    def __init__(self, state_store: StateStore, legacy_db_path: str = 'db.json'):
         """Initialize the device state manager.
         
         Args:
-            db_path: Path to the TinyDB database file
+            state_store: SQLite store holding the ``<device>_state`` documents
+            legacy_db_path: TinyDB file that held device states before the state store
         """
-        self.db_path = db_path
+        self.state_store = state_store
+        self._migrate_legacy_states(legacy_db_path)
+
+    def _migrate_legacy_states(self, legacy_db_path: str):
+        """Copy device states missing from the state store from the legacy TinyDB file."""
+        if not os.path.exists(legacy_db_path):
+            return
+        with TinyDB(legacy_db_path, storage=FastJSONStorage) as db:
+            legacy_docs = db.search(where('id').test(lambda doc_id: str(doc_id).endswith('_state')))
+        if not legacy_docs:
+            return
+        existing = self.state_store.get_many([doc['id'] for doc in legacy_docs])
+        for doc in legacy_docs:
+            if doc['id'] not in existing:
+                self.state_store.upsert(dict(doc))
+                logger.info(f"💾 Migrated {doc['id']} from {legacy_db_path} to the state store")
 
     def get_device_state(self, device: str) -> dict:
-        """Get the last run state for a device from TinyDB.
+        """Get the last run state for a device from the state store.
         
         Args:
             device: Device name (e.g., 'wp', 'hw', 'battery')
@@ -34,51 +57,110 @@ class DeviceStateManager:
         Returns:
             dict with:
                 - 'last_run_end': datetime or None - when the last run ended
-                - 'locked_starts': list of datetimes - scheduled start times
+                - 'locked_start_base': datetime or None - reference time of the scheduled starts
+                - 'locked_start_minutes': list of ints - scheduled start times as minutes
+                  after locked_start_base
         """
-        with TinyDB(self.db_path) as db:
-            state_doc = db.get(Query().id == f"{device}_state")
+        return self._parse_state(self.state_store.get(f"{device}_state"))
+
+    def get_device_states(self, devices: list[str]) -> dict[str, dict]:
+        """Get the last run states for several devices in a single state store query.
         
+        Args:
+            devices: Device names
+            
+        Returns:
+            dict mapping device name to its state (see get_device_state)
+        """
+        state_docs = self.state_store.get_many([f"{device}_state" for device in devices])
+        return {device: self._parse_state(state_docs.get(f"{device}_state")) for device in devices}
+
+    @staticmethod
+    def _parse_state(state_doc: dict | None) -> dict:
+        """Convert a stored state document into last_run_end and integer scheduled start offsets.
+        
+        Scheduled starts are stored as slot indices relative to the horizon they were
+        scheduled in, so only that horizon start is parsed. Documents written before
+        that hold a list of ISO start times ('locked_starts'), which are still read.
+        """
+        state = {'last_run_end': None, 'locked_start_base': None, 'locked_start_minutes': []}
         if not state_doc:
-            return {'last_run_end': None, 'locked_starts': []}
+            return state
         
-        last_run_end = None
         if state_doc.get('last_run_end'):
             try:
-                last_run_end = datetime.fromisoformat(state_doc['last_run_end'])
+                state['last_run_end'] = datetime.fromisoformat(state_doc['last_run_end'])
             except (ValueError, TypeError):
                 pass
         
+        if 'locked_start_slots' in state_doc:
+            try:
+                state['locked_start_base'] = datetime.fromisoformat(state_doc['horizon_start'])
+                slot_minutes = int(state_doc['slot_minutes'])
+                state['locked_start_minutes'] = [int(slot) * slot_minutes for slot in state_doc['locked_start_slots']]
+            except (KeyError, ValueError, TypeError):
+                pass
+            return state
+        
         locked_starts = []
         for start_str in state_doc.get('locked_starts', []):
             try:
                 locked_starts.append(datetime.fromisoformat(start_str))
             except (ValueError, TypeError):
                 pass
-        
-        return {'last_run_end': last_run_end, 'locked_starts': locked_starts}
+        if locked_starts:
+            state['locked_start_base'] = locked_starts[0]
+            state['locked_start_minutes'] = [(start - locked_starts[0]) // ONE_MINUTE for start in locked_starts]
+        return state
 
-    def save_device_state(self, device: str, last_run_end: datetime | None, 
-                          scheduled_starts: list[datetime]):
-        """Save device state to TinyDB for the next optimization run.
+    @staticmethod
+    def build_state_doc(device: str, last_run_end: datetime | None, horizon_start: datetime,
+                        slot_minutes: int, start_slots: list[int], updated_at: datetime | None = None) -> dict:
+        """Build the state document of a device for the next optimization run.
         
         Args:
             device: Device name (e.g., 'wp', 'hw')
             last_run_end: datetime of when the last run ended (or will end)
-            scheduled_starts: list of datetime objects for scheduled start times
+            horizon_start: datetime of slot 0 of the horizon the starts were scheduled in
+            slot_minutes: Duration of each slot in minutes
+            start_slots: Slot indices of the scheduled start times
+            updated_at: Timestamp to store (defaults to now)
         """
-        with TinyDB(self.db_path) as db:
-            state = {
-                'id': f"{device}_state",
-                'last_run_end': last_run_end.isoformat() if last_run_end else None,
-                'locked_starts': [s.isoformat() for s in scheduled_starts],
-                'updated_at': datetime.now().isoformat()
-            }
-            db.upsert(state, Query().id == f"{device}_state")
-        logger.debug(f"💾 Saved {device} state: last_run_end={last_run_end}, locked_starts={len(scheduled_starts)}")
+        return {
+            'id': f"{device}_state",
+            'last_run_end': last_run_end.isoformat() if last_run_end else None,
+            'horizon_start': horizon_start.isoformat(),
+            'slot_minutes': slot_minutes,
+            'locked_start_slots': [int(slot) for slot in start_slots],
+            'updated_at': (updated_at or datetime.now()).isoformat()
+        }
+
+    def save_device_state(self, device: str, last_run_end: datetime | None, horizon_start: datetime,
+                          slot_minutes: int, start_slots: list[int], updated_at: datetime | None = None):
+        """Save device state to the state store (arguments as for build_state_doc)."""
+        self.save_device_states([
+            self.build_state_doc(device, last_run_end, horizon_start, slot_minutes, start_slots, updated_at)
+        ])
+
+    def save_device_states(self, state_docs: list[dict]):
+        """Save state documents from build_state_doc in one state store transaction."""
+        self.state_store.upsert_many(state_docs)
+        for doc in state_docs:
+            logger.debug(f"💾 Saved {doc['id']}: last_run_end={doc['last_run_end']}, "
+                         f"locked_starts={len(doc['locked_start_slots'])}")
+
+    @staticmethod
+    def _start_minutes(state: dict, horizon_start: datetime) -> list[int]:
+        """Return the scheduled starts of a state as minutes after horizon_start."""
+        base = state['locked_start_base']
+        if base is None:
+            return []
+        offset = (base - horizon_start) // ONE_MINUTE
+        return [minutes + offset for minutes in state['locked_start_minutes']]
 
     def calculate_initial_gap(self, device: str, horizon_start: datetime, 
-                               slot_minutes: int, block_hours: float) -> int:
+                               slot_minutes: int, block_hours: float,
+                               state: dict | None = None) -> int:
         """Calculate how many slots since the device last ran.
         
         This is used by the optimizer to determine when the device must run
@@ -89,11 +171,13 @@ class DeviceStateManager:
             horizon_start: datetime when the optimization horizon starts
             slot_minutes: Duration of each slot in minutes
             block_hours: Duration of each block in hours
+            state: Device state from get_device_states (read from the state store if None)
             
         Returns:
             Number of slots since last run ended (0 if currently running or just ended)
         """
-        state = self.get_device_state(device)
+        if state is None:
+            state = self.get_device_state(device)
         last_run_end = state['last_run_end']
         
         if last_run_end is None:
@@ -114,7 +198,8 @@ class DeviceStateManager:
         return gap_slots
 
     def get_locked_slots(self, device: str, horizon_start: datetime, 
-                          lock_end_datetime: datetime, slot_minutes: int) -> set[int]:
+                          lock_end_datetime: datetime, slot_minutes: int,
+                          state: dict | None = None) -> set[int]:
         """Get slot indices that are locked (already scheduled and shouldn't be changed).
         
         Locked slots are:
@@ -126,22 +211,47 @@ class DeviceStateManager:
             horizon_start: datetime when horizon starts
             lock_end_datetime: datetime until which slots are locked
             slot_minutes: Duration of each slot in minutes
+            state: Device state from get_device_states (read from the state store if None)
             
         Returns:
             Set of slot indices that are locked
         """
-        state = self.get_device_state(device)
-        locked_starts = state['locked_starts']
+        if state is None:
+            state = self.get_device_state(device)
+        lock_end_minutes = (lock_end_datetime - horizon_start) // ONE_MINUTE
         
         locked_slots = set()
-        for start_dt in locked_starts:
+        for start_minutes in self._start_minutes(state, horizon_start):
             # Only lock if the start is:
             # 1. Within the horizon
             # 2. Before the lock end time
-            if start_dt >= horizon_start and start_dt < lock_end_datetime:
-                slot_idx = int((start_dt - horizon_start).total_seconds() / 60 / slot_minutes)
-                if slot_idx >= 0:
-                    locked_slots.add(slot_idx)
-                    logger.debug(f"🔒 {device}: Locked slot {slot_idx} (start at {start_dt})")
+            if 0 <= start_minutes < lock_end_minutes:
+                slot_idx = start_minutes // slot_minutes
+                locked_slots.add(slot_idx)
+                logger.debug(f"🔒 {device}: Locked slot {slot_idx} (start at +{start_minutes} min)")
         
         return locked_slots
+
+    def get_device_context(self, devices: list[str], horizon_start: datetime,
+                           lock_end_datetime: datetime, slot_minutes: int) -> dict[str, tuple]:
+        """Get the optimizer inputs derived from the stored state of several devices.
+        
+        Reads all device states in one state store query instead of one per value.
+        
+        Args:
+            devices: Device names
+            horizon_start: datetime when horizon starts
+            lock_end_datetime: datetime until which slots are locked
+            slot_minutes: Duration of each slot in minutes
+            
+        Returns:
+            dict mapping device name to (initial_gap_slots, locked_slots)
+        """
+        states = self.get_device_states(devices)
+        return {
+            device: (
+                self.calculate_initial_gap(device, horizon_start, slot_minutes, None, state=state),
+                self.get_locked_slots(device, horizon_start, lock_end_datetime, slot_minutes, state=state),
+            )
+            for device, state in states.items()
+        }
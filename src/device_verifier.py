@@ -9,14 +9,11 @@ This module provides functionality to verify device states and retry actions if
 
 import logging
 import asyncio
-import aiohttp
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
-from tinydb import TinyDB, Query
-
 from .devices_config import devices_config, ActionSet
+from .state_store import StateStore
 from .utils import ensure_list, evaluate_expression
-from .config import CONFIG
 
 logger = logging.getLogger(__name__)
 
@@ -45,12 +42,10 @@ class DeviceVerifier:
         """
         self.devices = devices_instance
         self.scheduler = scheduler
-        self.ha_url = CONFIG['options']['ha_url']
-        self.headers = {
-            "Authorization": f"Bearer {devices_instance.headers['Authorization'].split(' ')[1]}",
-            "Content-Type": "application/json",
-        }
+        # State reads go through the devices' Home Assistant client and its pooled session
+        self.ha_client = devices_instance.ha_client
         self.devices_config = devices_config
+        self.state_store = StateStore()
         # Track pending verifications: {device_name: {action_label, end_time, verification_count}}
         self._pending_verifications = {}
 
@@ -63,14 +58,11 @@ class DeviceVerifier:
         Returns:
             dict: Entity state data or None if failed
         """
-        url = f"{self.ha_url}/api/states/{entity_id}"
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=self.headers) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    logger.warning(f"Failed to get state for {entity_id}: HTTP {response.status}")
-                    return None
+            state = await self.ha_client.get_state(entity_id)
+            if state is None:
+                logger.warning(f"Failed to get state for {entity_id}")
+            return state
         except Exception as e:
             logger.error(f"Error getting state for {entity_id}: {e}")
             return None
@@ -258,21 +250,17 @@ class DeviceVerifier:
                 return True
             action_set = device_obj.start if action_label == "start" else device_obj.stop
         
-        all_passed = True
-        
-        # Verify MQTT actions
-        for mqtt_action in action_set.mqtt:
-            mqtt_config = mqtt_action.model_dump(exclude_none=True)
-            if not await self.verify_mqtt_action(mqtt_config, context):
-                all_passed = False
-        
-        # Verify entity actions
-        for entity_action in action_set.entity:
-            entity_config = entity_action.model_dump(exclude_none=True)
-            if not await self.verify_entity_action(entity_config, context):
-                all_passed = False
-        
-        return all_passed
+        # Verify MQTT and entity actions; the state reads are independent and run concurrently
+        checks = [
+            self.verify_mqtt_action(mqtt_action.model_dump(exclude_none=True), context)
+            for mqtt_action in action_set.mqtt
+        ] + [
+            self.verify_entity_action(entity_action.model_dump(exclude_none=True), context)
+            for entity_action in action_set.entity
+        ]
+        results = await asyncio.gather(*checks)
+        
+        return all(results)
 
     def register_action(self, device: str, action_label: str, context: Optional[Dict] = None):
         """Register a device action for post-action verification.
@@ -389,12 +377,11 @@ class DeviceVerifier:
         """
         logger.info("🔍 Running periodic device state verification...")
         
-        # Load current schedule from TinyDB
+        # Load current schedule from the state store
         try:
-            with TinyDB('db.json') as db:
-                schedule_doc = db.get(Query().id == "schedule")
+            schedule_doc = self.state_store.get("schedule")
         except Exception as e:
-            logger.error(f"Failed to load schedule from TinyDB: {e}")
+            logger.error(f"Failed to load schedule from the state store: {e}")
             return
         
         if not schedule_doc or "schedule" not in schedule_doc:
@@ -434,10 +421,12 @@ class DeviceVerifier:
                 # No active slot for this device yet — it should be off
                 device_states[device] = "stop"
         
-        # Verify each device's expected state and re-apply the action when needed
-        for device, expected_action in device_states.items():
-            is_correct = await self.verify_device_action(device, expected_action)
-            
+        # Verify all devices concurrently, then re-apply the action where needed
+        verified = await asyncio.gather(
+            *(self.verify_device_action(device, expected_action)
+              for device, expected_action in device_states.items())
+        )
+        for (device, expected_action), is_correct in zip(device_states.items(), verified):
             if not is_correct:
                 logger.warning(f"⚠️ Device {device} not in expected {expected_action} state during periodic check, executing action...")
                 action_set = self._get_action_set(device, expected_action)
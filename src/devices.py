@@ -1,6 +1,6 @@
 import logging
-import aiohttp
 from .devices_config import devices_config
+from .ha_client import HomeAssistantClient
 from .utils import ensure_list, evaluate_expression
 from .config import CONFIG
 
@@ -13,12 +13,17 @@ class Devices:
     # Class-level reference to verifier (set externally)
     _verifier = None
 
-    def __init__(self, access_token):
+    def __init__(self, access_token, ha_client=None):
+        """Initialize device action handling.
+        
+        Args:
+            access_token: Home Assistant Long-Lived Access Token
+            ha_client: Optional HomeAssistantClient to share its HTTP session;
+                a new client is created when omitted
+        """
         self.ha_url = CONFIG['options']['ha_url']
-        self.headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json",
-        }
+        self.ha_client = ha_client or HomeAssistantClient(access_token)
+        self.headers = self.ha_client.headers
         self.devices_config = devices_config
 
     @classmethod
@@ -40,11 +45,7 @@ class Devices:
         Returns:
             bool: True if service call was successful
         """
-        domain, service_name = service.split('/')
-        url = f"{self.ha_url}/api/services/{domain}/{service_name}"
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=self.headers, json=service_data) as response:
-                return response.status == 200
+        return await self.ha_client.call_service(service, **service_data)
 
     def get_device(self, device_name):
         """Get device configuration by name.
@@ -9,7 +9,7 @@ Configuration is loaded from environment variables or config files.
 """
 
 from typing import Dict, List, Optional, Literal, Any, Union
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from pydantic_settings import BaseSettings, SettingsConfigDict, JsonConfigSettingsSource, PydanticBaseSettingsSource
 import json
 import os
@@ -110,6 +110,13 @@ class DevicesConfig(BaseSettings):
     )
     
     devices: List[Device] = Field(default_factory=list)
+    # Devices grouped by type, built once after validation
+    _by_type: Dict[str, List[Device]] = PrivateAttr(default_factory=dict)
+    
+    def model_post_init(self, __context: Any) -> None:
+        """Group the configured devices by type."""
+        for device in self.devices:
+            self._by_type.setdefault(device.type, []).append(device)
     
     @classmethod
     def settings_customise_sources(
@@ -137,7 +144,7 @@ class DevicesConfig(BaseSettings):
     
     def get_devices_by_type(self, device_type: DeviceType) -> List[Device]:
         """Get all devices of a specific type."""
-        return [d for d in self.devices if d.type == device_type]
+        return self._by_type.get(device_type, [])
 
 
 # Load default configuration from file if it exists
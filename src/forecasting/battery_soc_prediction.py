@@ -10,8 +10,8 @@ logger = logging.getLogger(__name__)
 
 
 def predict_battery_soc(
-    charge_times: list[str],
-    discharge_times: list[str],
+    charge_slots: list[int],
+    discharge_slots: list[int],
     slot_minutes: int,
     horizon_start: datetime,
     horizon_end: datetime,
@@ -34,8 +34,8 @@ def predict_battery_soc(
     power consumption and solar production.
 
     Args:
-        charge_times: Charge slot start times in HH:MM format relative to horizon_start.
-        discharge_times: Discharge slot start times in HH:MM format relative to horizon_start.
+        charge_slots: Charge slot indices relative to horizon_start.
+        discharge_slots: Discharge slot indices relative to horizon_start.
         slot_minutes: Duration of each time slot in minutes.
         horizon_start: Start datetime of the optimization horizon.
         horizon_end: End datetime of the optimization horizon.
@@ -59,13 +59,8 @@ def predict_battery_soc(
     slot_hours = slot_minutes / 60
     charge_energy_per_slot = battery_charge_speed_kw * slot_hours
 
-    # Convert HH:MM strings to slot indices relative to horizon_start
-    def time_to_slot_idx(time_str: str) -> int:
-        hour, minute = map(int, time_str.split(":"))
-        return (hour * 60 + minute) // slot_minutes
-
-    charge_slots = {time_to_slot_idx(t) for t in (charge_times or [])}
-    discharge_slots = {time_to_slot_idx(t) for t in (discharge_times or [])}
+    charge_slots = set(charge_slots or ())
+    discharge_slots = set(discharge_slots or ())
 
     # Build per-slot predicted usage and solar lookup (slot_idx → kWh per slot)
     horizon_start_naive = horizon_start.replace(tzinfo=None)
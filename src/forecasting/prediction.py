@@ -3,9 +3,11 @@ import numpy as np
 import lightgbm as lgb
 from datetime import datetime, timedelta
 import logging
+import hashlib
 from sklearn.metrics import mean_absolute_error
 from tinydb import TinyDB, Query
 from ..config import CONFIG
+from ..json_storage import FastJSONStorage
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +17,37 @@ class Prediction:
         self.weather = weather
         self.price_history_manager = price_history_manager
         self.days_back = CONFIG['options'].get('prediction_days_back', 365)
+        # The feature and full-history CSV dumps are only written when asked for
+        self.export_debug_csv = CONFIG['options'].get('export_prediction_debug_csv', False)
+        # Last fitted model per target, keyed by a hash of its training data
+        self._model_cache = {}
+
+    @staticmethod
+    def _training_data_key(features, target):
+        """Return a hash of the training features (values, index and columns) and target."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr(list(features.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(features, index=True).to_numpy().tobytes())
+        digest.update(pd.util.hash_pandas_object(target, index=True).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    def _fit_model(self, name, features, target):
+        """Fit a LightGBM regressor, reusing the previous fit for name when the training data is unchanged."""
+        key = self._training_data_key(features, target)
+        cached = self._model_cache.get(name)
+        if cached is not None and cached[0] == key:
+            logger.info(f"♻️ Training data unchanged, reusing the {name} model")
+            return cached[1]
+        model = lgb.LGBMRegressor(
+            n_estimators=200,
+            max_depth=6,
+            learning_rate=0.05,
+            num_leaves=31,
+            random_state=42
+        )
+        model.fit(features, target)
+        self._model_cache[name] = (key, model)
+        return model
 
     async def calculateTomorrowsPowerUsage(self):
         """
@@ -140,14 +173,7 @@ class Prediction:
         
         # 7. Train LightGBM Model
         logger.info("🤖 Training LightGBM model...")
-        lgb_reg = lgb.LGBMRegressor(
-            n_estimators=200,
-            max_depth=6,
-            learning_rate=0.05,
-            num_leaves=31,
-            random_state=42
-        )
-        lgb_reg.fit(features_train, target_train)
+        lgb_reg = self._fit_model('power usage', features_train, target_train)
         logger.info("✅ Model training complete")
         
         # 8. Evaluate on validation set
@@ -170,27 +196,24 @@ class Prediction:
         
         # 10. Prepare features for all forecast hours
         future_df = combined_weather_df[['hour', 'temperature', 'shortwave_radiation', 'date']].copy()
-        future_df['dayofweek'] = future_df['date'].apply(lambda d: pd.Timestamp(d).dayofweek)
+        future_df['dayofweek'] = pd.to_datetime(future_df['date']).dt.dayofweek
         
         # Add price data if available (use similar day prices as proxy)
         if has_price_data:
-            def get_price_for_row(row):
-                # Try to get similar day prices (same day of week from recent weeks)
-                similar_day_prices = merged_df[
-                    (merged_df['dayofweek'] == row['dayofweek']) & 
-                    (merged_df['timestamp'] >= merged_df['timestamp'].max() - pd.Timedelta(days=28))
-                ].groupby('hour')['price'].mean()
-                
-                price = similar_day_prices.get(row['hour'], np.nan)
-                
-                # If missing, use overall hourly average
-                if pd.isna(price):
-                    hourly_avg_prices = merged_df.groupby('hour')['price'].mean()
-                    price = hourly_avg_prices.get(row['hour'], merged_df['price'].mean())
-                
-                return price
+            # Similar day prices (same day of week from recent weeks), looked up for all rows at once
+            recent_df = merged_df[merged_df['timestamp'] >= merged_df['timestamp'].max() - pd.Timedelta(days=28)]
+            similar_day_prices = recent_df.groupby(['dayofweek', 'hour'])['price'].mean()
+            keys = pd.MultiIndex.from_arrays([future_df['dayofweek'], future_df['hour']])
+            prices = similar_day_prices.reindex(keys).to_numpy(dtype=np.float64)
             
-            future_df['price'] = future_df.apply(get_price_for_row, axis=1)
+            # If missing, use overall hourly average (or the overall average for unseen hours)
+            hourly_avg_prices = merged_df.groupby('hour')['price'].mean()
+            fallback = np.where(
+                future_df['hour'].isin(hourly_avg_prices.index).to_numpy(),
+                hourly_avg_prices.reindex(future_df['hour']).to_numpy(dtype=np.float64),
+                merged_df['price'].mean()
+            )
+            future_df['price'] = np.where(np.isnan(prices), fallback, prices)
         
         # Prepare features in correct order (without date column)
         future_features = future_df[feature_cols].copy()
@@ -287,13 +310,14 @@ class Prediction:
         tomorrow_results.to_csv("/app/tomorrow_hourly_predictions.csv", index=False)
         logger.info("💾 Tomorrow's predictions saved to: /app/tomorrow_hourly_predictions.csv")
         
-        # Export features for web UI download
-        future_df.to_csv("/app/forecast_features.csv", index=False)
-        logger.info("💾 Forecast features saved to: /app/forecast_features.csv")
-        
-        # Export full merged dataset for analysis
-        merged_df.to_csv("/app/merged_historical_data.csv", index=False)
-        logger.info("💾 Merged historical data saved to: /app/merged_historical_data.csv")
+        if self.export_debug_csv:
+            # Export features for web UI download
+            future_df.to_csv("/app/forecast_features.csv", index=False)
+            logger.info("💾 Forecast features saved to: /app/forecast_features.csv")
+            
+            # Export full merged dataset for analysis
+            merged_df.to_csv("/app/merged_historical_data.csv", index=False)
+            logger.info("💾 Merged historical data saved to: /app/merged_historical_data.csv")
         
         # Save predictions to TinyDB for web UI
         usage_records = [
@@ -303,7 +327,7 @@ class Prediction:
             }
             for _, row in results_df[['timestamp', 'predicted_kwh']].iterrows()
         ]
-        with TinyDB('db.json') as db:
+        with TinyDB('db.json', storage=FastJSONStorage) as db:
             existing = db.get(Query().id == 'predictions') or {}
             existing.update({
                 'id': 'predictions',
@@ -333,7 +357,6 @@ class Prediction:
         usage_df['timestamp'] = pd.to_datetime(usage_df['timestamp'])
         usage_df['hour'] = usage_df['timestamp'].dt.hour
         usage_df['dayofyear'] = usage_df['timestamp'].dt.dayofyear
-        usage_df['date'] = usage_df['timestamp'].dt.date
 
         logger.info(f"✅ Loaded {len(usage_df)} hourly solar production records")
 
@@ -391,14 +414,7 @@ class Prediction:
 
         # 6. Train LightGBM model
         logger.info("🤖 Training LightGBM model for solar production...")
-        lgb_solar = lgb.LGBMRegressor(
-            n_estimators=200,
-            max_depth=6,
-            learning_rate=0.05,
-            num_leaves=31,
-            random_state=42
-        )
-        lgb_solar.fit(features_train, target_train)
+        lgb_solar = self._fit_model('solar production', features_train, target_train)
         logger.info("✅ Solar model training complete")
 
         # 7. Evaluate
@@ -486,7 +502,7 @@ class Prediction:
             }
             for _, row in results_df[['timestamp', 'predicted_kwh']].iterrows()
         ]
-        with TinyDB('db.json') as db:
+        with TinyDB('db.json', storage=FastJSONStorage) as db:
             existing = db.get(Query().id == 'predictions') or {}
             existing.update({
                 'id': 'predictions',
@@ -498,6 +514,30 @@ class Prediction:
 
         return results_df
 
+    @staticmethod
+    def _resample_predictions(records, slot_minutes):
+        """Linearly interpolate hourly kWh predictions to slot_minutes slots.
+
+        The hourly rate is interpolated at every slot from the first to the last
+        prediction with np.interp and scaled to kWh per slot.
+        Returns a list of {'timestamp': ..., 'predicted_kwh': ...} dicts.
+        """
+        times = [datetime.fromisoformat(r['timestamp']) if isinstance(r['timestamp'], str) else r['timestamp']
+                 for r in records]
+        order = sorted(range(len(times)), key=times.__getitem__)
+        first = times[order[0]]
+        src_seconds = np.array([(times[i] - first).total_seconds() for i in order])
+        src_kwh = np.array([records[i]['predicted_kwh'] for i in order], dtype=np.float64)
+
+        slot_seconds = slot_minutes * 60
+        dst_seconds = np.arange(0, src_seconds[-1] + 1, slot_seconds)
+        slot_kwh = np.interp(dst_seconds, src_seconds, src_kwh) * (slot_minutes / 60)
+
+        return [
+            {'timestamp': first + timedelta(seconds=offset), 'predicted_kwh': kwh}
+            for offset, kwh in zip(dst_seconds.tolist(), slot_kwh.tolist())
+        ]
+
     @staticmethod
     def get_cached_usage(slot_minutes):
         """Return cached power usage predictions from TinyDB, resampled to slot_minutes intervals.
@@ -506,21 +546,14 @@ class Prediction:
         Returns a list of {'timestamp': ..., 'predicted_kwh': ...} dicts, or None if unavailable.
         """
         try:
-            with TinyDB('db.json') as db:
+            with TinyDB('db.json', storage=FastJSONStorage) as db:
                 predictions_doc = db.get(Query().id == 'predictions')
 
             if not predictions_doc or not predictions_doc.get('usage'):
                 logger.warning("⚠️ No cached power usage predictions found")
                 return None
 
-            df = pd.DataFrame(predictions_doc['usage'])
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df = df.set_index('timestamp')
-            df = df.resample(f'{slot_minutes}min').interpolate(method='linear')
-            df = df.reset_index()
-            df['predicted_kwh'] = df['predicted_kwh'] * (slot_minutes / 60)
-
-            result = df[['timestamp', 'predicted_kwh']].to_dict('records')
+            result = Prediction._resample_predictions(predictions_doc['usage'], slot_minutes)
             logger.debug(f"🔋 Loaded {len(result)} {slot_minutes}-min slots of cached power usage predictions")
             return result
         except Exception as e:
@@ -535,21 +568,14 @@ class Prediction:
         Returns a list of {'timestamp': ..., 'predicted_kwh': ...} dicts, or None if unavailable.
         """
         try:
-            with TinyDB('db.json') as db:
+            with TinyDB('db.json', storage=FastJSONStorage) as db:
                 predictions_doc = db.get(Query().id == 'predictions')
 
             if not predictions_doc or not predictions_doc.get('solar'):
                 logger.warning("⚠️ No cached solar production predictions found")
                 return None
 
-            df = pd.DataFrame(predictions_doc['solar'])
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df = df.set_index('timestamp')
-            df = df.resample(f'{slot_minutes}min').interpolate(method='linear')
-            df = df.reset_index()
-            df['predicted_kwh'] = df['predicted_kwh'] * (slot_minutes / 60)
-
-            result = df[['timestamp', 'predicted_kwh']].to_dict('records')
+            result = Prediction._resample_predictions(predictions_doc['solar'], slot_minutes)
             logger.debug(f"☀️ Loaded {len(result)} {slot_minutes}-min slots of cached solar production predictions")
             return result
         except Exception as e:
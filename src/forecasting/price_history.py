@@ -9,6 +9,8 @@ import logging
 from datetime import datetime, timedelta, timezone
 import pandas as pd
 from tinydb import TinyDB, Query
+
+from ..json_storage import FastJSONStorage
 from entsoe import EntsoePandasClient
 
 logger = logging.getLogger(__name__)
@@ -29,6 +31,9 @@ class PriceHistoryManager:
         self.country_code = country_code
         self.db_path = db_path
         self.client = EntsoePandasClient(api_token) if api_token else None
+        # Percentile results keyed by (date, days_back, charge_percentile, discharge_percentile);
+        # the history only gains a day at a time, so results are reused for the rest of the day
+        self._percentile_cache = {}
         
     def _get_date_range_to_fetch(self, start_date, end_date):
         """Determine which dates are missing from the database.
@@ -40,7 +45,7 @@ class PriceHistoryManager:
         Returns:
             list of (start_date, end_date) tuples that need to be fetched
         """
-        with TinyDB(self.db_path) as db:
+        with TinyDB(self.db_path, storage=FastJSONStorage) as db:
             price_query = Query()
             records = db.search(
                 (price_query.date >= start_date.isoformat()) & 
@@ -148,7 +153,7 @@ class PriceHistoryManager:
         Args:
             prices_series: pandas.Series with datetime index and price values
         """
-        with TinyDB(self.db_path) as db:
+        with TinyDB(self.db_path, storage=FastJSONStorage) as db:
             for timestamp, price in prices_series.items():
                 # Convert timestamp to local timezone and extract components
                 local_ts = timestamp.tz_convert('Europe/Brussels')
@@ -172,7 +177,7 @@ class PriceHistoryManager:
         """
         cutoff_date = (datetime.now().date() - timedelta(days=keep_days)).isoformat()
         
-        with TinyDB(self.db_path) as db:
+        with TinyDB(self.db_path, storage=FastJSONStorage) as db:
             price_query = Query()
             removed = db.remove(price_query.date < cutoff_date)
             
@@ -218,7 +223,7 @@ class PriceHistoryManager:
         self._cleanup_old_data()
         
         # Retrieve all data from database
-        with TinyDB(self.db_path) as db:
+        with TinyDB(self.db_path, storage=FastJSONStorage) as db:
             price_query = Query()
             records = db.search(
                 (price_query.date >= start_date.isoformat()) & 
@@ -253,6 +258,15 @@ class PriceHistoryManager:
         """
         import numpy as np
         
+        today = datetime.now().date()
+        cache_key = (today, days_back, charge_percentile, discharge_percentile)
+        # Drop results from previous days
+        for key in [key for key in self._percentile_cache if key[0] != today]:
+            del self._percentile_cache[key]
+        if cache_key in self._percentile_cache:
+            logger.info(f"📊 Using today's cached price percentiles (last {days_back} days, charge={charge_percentile}th, discharge={discharge_percentile}th)")
+            return self._percentile_cache[cache_key]
+        
         logger.info(f"📊 Calculating price percentiles from last {days_back} days (charge={charge_percentile}th, discharge={discharge_percentile}th)")
         
         # Fetch historical prices (uses cache first)
@@ -280,7 +294,7 @@ class PriceHistoryManager:
         logger.info(f"🔋 Battery thresholds: max_charge_price={max_charge_price:.4f} EUR/kWh ({charge_percentile}th percentile), "
                    f"min_discharge_price={min_discharge_price:.4f} EUR/kWh ({discharge_percentile}th percentile)")
         
-        return {
+        result = {
             'max_charge_price': max_charge_price,
             'min_discharge_price': min_discharge_price,
             'price_stats': {
@@ -291,4 +305,6 @@ class PriceHistoryManager:
                 'days_analyzed': days_back,
                 'data_points': len(prices)
             }
-        }
\ No newline at end of file
+        }
+        self._percentile_cache[cache_key] = result
+        return result
\ No newline at end of file
@@ -147,7 +147,6 @@ class Weather:
             'shortwave_radiation': data["hourly"]["shortwave_radiation"]
         })
         df['hour'] = df['timestamp'].dt.hour
-        df['date'] = df['timestamp'].dt.date
         df['dayofweek'] = df['timestamp'].dt.dayofweek
         
         logger.info(f"Successfully created DataFrame with {len(df)} hourly rows")
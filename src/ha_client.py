@@ -28,6 +28,27 @@ class HomeAssistantClient:
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json",
         }
+        # Keep-alive session shared by all requests, created on first use inside the event loop
+        self._session: aiohttp.ClientSession | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared HTTP session, (re)creating it when needed."""
+        if self._session is None or self._session.closed:
+            # All requests go to the one Home Assistant host, so the per-host cap bounds
+            # the concurrency of gathered calls; both limits can be tuned per deployment
+            connector = aiohttp.TCPConnector(
+                limit=CONFIG['options'].get('ha_connection_limit', 256),
+                limit_per_host=CONFIG['options'].get('ha_per_host_limit', 8),
+                ttl_dns_cache=300,
+                keepalive_timeout=75,
+            )
+            self._session = aiohttp.ClientSession(headers=self.headers, connector=connector)
+        return self._session
+
+    async def close(self):
+        """Close the shared HTTP session."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
 
     def get_access_token(self) -> str:
         """Get the access token for external use.
@@ -50,11 +71,10 @@ class HomeAssistantClient:
             Entity state dict or None if not found/error
         """
         url = f"{self.ha_url}/api/states/{entity_id}"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=self.headers) as response:
-                if response.status == 200:
-                    return await response.json()
-                return None
+        async with self._get_session().get(url) as response:
+            if response.status == 200:
+                return await response.json()
+            return None
 
     async def call_service(self, service: str, **service_data) -> bool:
         """Call a Home Assistant service.
@@ -69,9 +89,8 @@ class HomeAssistantClient:
         domain, service_name = service.split('/')
         url = f"{self.ha_url}/api/services/{domain}/{service_name}"
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=self.headers, json=service_data) as response:
-                return response.status == 200
+        async with self._get_session().post(url, json=service_data) as response:
+            return response.status == 200
 
     async def get_avg_temperature_48h(self, entity_id: str) -> Optional[float]:
         """Fetch the 48-hour average value of a temperature sensor from HA history.
@@ -92,12 +111,11 @@ class HomeAssistantClient:
         )
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=self.headers) as response:
-                    if response.status != 200:
-                        logger.error(f"Failed to fetch 48h history for {entity_id}: HTTP {response.status}")
-                        return None
-                    data = await response.json()
+            async with self._get_session().get(url) as response:
+                if response.status != 200:
+                    logger.error(f"Failed to fetch 48h history for {entity_id}: HTTP {response.status}")
+                    return None
+                data = await response.json()
 
             if not data or not data[0]:
                 logger.warning(f"No history data returned for {entity_id}")
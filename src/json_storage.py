@@ -0,0 +1,36 @@
+"""TinyDB JSON storage using the shared JSON helpers.
+
+TinyDB's ``JSONStorage`` parses and serializes the whole database file with the
+stdlib ``json`` module on every access. ``FastJSONStorage`` keeps the same file
+format and handling but goes through ``json_loads``/``json_dumps`` from utils,
+which use orjson when it is installed.
+"""
+import io
+import os
+
+from tinydb.storages import JSONStorage
+
+from .utils import json_dumps, json_loads
+
+
+class FastJSONStorage(JSONStorage):
+    """JSONStorage that reads and writes through orjson when available."""
+
+    def read(self):
+        # Empty file: return None so TinyDB initializes the database
+        self._handle.seek(0, os.SEEK_END)
+        if not self._handle.tell():
+            return None
+        self._handle.seek(0)
+        return json_loads(self._handle.read())
+
+    def write(self, data):
+        self._handle.seek(0)
+        try:
+            self._handle.write(json_dumps(data))
+        except io.UnsupportedOperation:
+            raise IOError(f'Cannot write to the database. Access mode is "{self._mode}"')
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        # Drop leftover data if the file got shorter
+        self._handle.truncate()
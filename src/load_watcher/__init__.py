@@ -12,6 +12,7 @@ from tinydb import TinyDB, Query
 
 from ..config import CONFIG
 from ..devices import Devices
+from ..json_storage import FastJSONStorage
 from .energy_monitor import EnergyMonitor
 from .peak_calculator import PeakCalculator
 from .limit_calculator import LimitCalculator
@@ -23,11 +24,13 @@ logger = logging.getLogger(__name__)
 class LoadWatcher:
     """Main orchestrator for load watching and management."""
     
-    def __init__(self, access_token):
+    def __init__(self, access_token, ha_client=None):
         """Initialize the load watcher.
         
         Args:
             access_token: Home Assistant access token
+            ha_client: Optional HomeAssistantClient to share its HTTP session;
+                a new client is created when omitted
         """
         self.ha_url = CONFIG['options']['ha_url']
         self.headers = {
@@ -38,8 +41,8 @@ class LoadWatcher:
         self.max_peak_kw = CONFIG['options'].get('max_peak_kW', 7.5)
         self.peak_calculation_minutes = CONFIG['options'].get('peak_calculation_minutes', 15)
         self.load_watcher_threshold_power = CONFIG['options'].get('load_watcher_threshold_power', 10)
-        self.db = TinyDB('db.json')
-        self.devices = Devices(access_token)
+        self.db = TinyDB('db.json', storage=FastJSONStorage)
+        self.devices = Devices(access_token, ha_client)
         
         # Initialize sub-components
         self.energy_monitor = EnergyMonitor(
@@ -20,6 +20,7 @@ from .optimization import (
     optimize_hw,
     optimize_battery,
     optimize_bat_discharge,
+    optimize_battery_schedule,
     optimize_ev,
     limit_battery_cycles,
 )
@@ -30,6 +31,7 @@ __all__ = [
     'optimize_hw',
     'optimize_battery',
     'optimize_bat_discharge',
+    'optimize_battery_schedule',
     'optimize_ev',
     'limit_battery_cycles',
 ]
\ No newline at end of file
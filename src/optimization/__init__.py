@@ -1,7 +1,7 @@
 """Optimization algorithms for energy devices.
 
 This package contains optimization algorithms for different device types:
-- thermal: Heat pump and hot water optimization (MILP-based)
+- thermal: Heat pump and hot water optimization (dynamic program / MILP)
 - battery: Battery charge/discharge optimization (price threshold-based)
 - ev: EV charging optimization (simple threshold-based)
 - ev_solar_charge: Solar-surplus-based EV charge controller
@@ -9,10 +9,11 @@ This package contains optimization algorithms for different device types:
 """
 
 from .thermal import optimize_thermal_device, optimize_wp, optimize_hw
-from .battery import optimize_battery, optimize_bat_discharge
+from .battery import optimize_battery, optimize_bat_discharge, optimize_battery_schedule
 from .ev import optimize_ev
 from .ev_solar_charge import EvSolarChargeController
 from .battery_limiter import limit_battery_cycles
+from ._jit import HAVE_NUMBA
 
 __all__ = [
     'optimize_thermal_device',
@@ -20,7 +21,9 @@ __all__ = [
     'optimize_hw',
     'optimize_battery',
     'optimize_bat_discharge',
+    'optimize_battery_schedule',
     'optimize_ev',
     'EvSolarChargeController',
     'limit_battery_cycles',
+    'HAVE_NUMBA',
 ]
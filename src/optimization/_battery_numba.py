@@ -0,0 +1,56 @@
+"""Compiled slot selection kernel for battery charge/discharge optimization.
+
+``select_battery_slots`` evaluates the charge and discharge threshold filters
+and their price difference rules in a single pass over the prices, so the
+charge and discharge optimizers share one read of the horizon. It is compiled
+with Numba when available (see ``_jit``).
+"""
+import numpy as np
+
+from ._jit import njit
+
+
+@njit(cache=True)
+def select_battery_slots(prices, max_charge_price, min_discharge_price, diff_thresh, discharge_ref_price):
+    """Select charge and discharge slots by price thresholds and price difference.
+
+    Args:
+        prices: float64 array of prices per slot
+        max_charge_price: Slots priced at or below this are charge slots
+        min_discharge_price: Slots priced at or above this are discharge slots
+        diff_thresh: Slots are also charge slots when a later slot is more expensive
+            by at least this amount, and discharge slots when they are more expensive
+            than discharge_ref_price by at least this amount; values <= 0 disable both
+        discharge_ref_price: Reference minimum price for the discharge price difference
+
+    A NaN threshold (and reference) disables that side entirely.
+
+    Returns:
+        Tuple of (charge slot indices, number of slots below max_charge_price,
+        discharge slot indices, number of slots above min_discharge_price).
+        Slot indices are in time order.
+    """
+    n = prices.shape[0]
+    charge_mask = np.empty(n, dtype=np.bool_)
+    discharge_mask = np.empty(n, dtype=np.bool_)
+    use_diff = diff_thresh > 0
+    discharge_diff_price = discharge_ref_price + diff_thresh
+    n_below = 0
+    n_above = 0
+    future_max = -np.inf
+
+    # Walk backwards so the running maximum always covers the later slots
+    for i in range(n - 1, -1, -1):
+        price = prices[i]
+        below = price <= max_charge_price
+        above = price >= min_discharge_price
+        if below:
+            n_below += 1
+        if above:
+            n_above += 1
+        charge_mask[i] = below or (use_diff and future_max >= price + diff_thresh)
+        discharge_mask[i] = above or (use_diff and price >= discharge_diff_price)
+        if price > future_max:
+            future_max = price
+
+    return np.flatnonzero(charge_mask), n_below, np.flatnonzero(discharge_mask), n_above
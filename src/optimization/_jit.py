@@ -0,0 +1,21 @@
+"""Optional Numba JIT support for the optimization kernels.
+
+Numba has no wheels for every architecture this add-on is built for
+(armhf, armv7, i386), so it is treated as an optional dependency.
+When it is not installed, ``njit`` degrades to a no-op decorator and the
+kernels run as plain Python with identical results.
+"""
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        """No-op stand-in for ``numba.njit`` supporting both decorator forms."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+__all__ = ['njit', 'HAVE_NUMBA']
@@ -0,0 +1,24 @@
+"""Cached slot index to time string lookup for the optimizers.
+
+The thermal, battery and EV optimizers and the negative-price export blocking
+all convert slot indices of the same horizon to HH:MM strings within one
+optimization round, so the table is built once per (formatter, slot length,
+horizon length) and shared between them. The optimizer maps the returned
+strings back to slot indices through the inverse table.
+"""
+from functools import lru_cache
+
+
+@lru_cache(maxsize=8)
+def slot_time_table(slot_to_time, slot_minutes: int, n_slots: int) -> tuple[str, ...]:
+    """Return the start time string of every slot in a horizon of n_slots slots."""
+    return tuple(slot_to_time(i, slot_minutes) for i in range(n_slots))
+
+
+@lru_cache(maxsize=8)
+def slot_index_table(slot_to_time, slot_minutes: int, n_slots: int) -> dict[str, int]:
+    """Return the slot index of every start time string in a horizon of n_slots slots.
+
+    Inverse of slot_time_table. The dict is shared between callers and must not be modified.
+    """
+    return {time_str: i for i, time_str in enumerate(slot_time_table(slot_to_time, slot_minutes, n_slots))}
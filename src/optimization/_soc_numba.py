@@ -0,0 +1,66 @@
+"""Compiled SOC simulation kernel for the battery cycle limiter.
+
+``simulate_soc_nb`` is the innermost call of the greedy slot selection in
+``limit_battery_cycles`` and runs O(K²) times per invocation, so it is
+compiled with Numba when available (see ``_jit``).
+"""
+from ._jit import njit
+
+# Slot kinds used in the ``kinds`` array
+SLOT_CHARGE = 0
+SLOT_DISCHARGE = 1
+
+
+@njit(cache=True)
+def simulate_soc_nb(slots, kinds, net_usage, soc0, cap, min_pct, max_pct, e_per_slot):
+    """Simulate the battery SOC over a time-ordered list of slots.
+
+    Args:
+        slots: int64 array of slot indices, sorted ascending
+        kinds: int8 array parallel to ``slots`` (SLOT_CHARGE or SLOT_DISCHARGE)
+        net_usage: float64 array of predicted usage minus solar per slot (kWh);
+            slots beyond its length are treated as 0
+        soc0: Starting SOC in percent
+        cap: Battery capacity in kWh
+        min_pct: Minimum SOC in percent
+        max_pct: Maximum SOC in percent
+        e_per_slot: Energy per slot when charging at full speed (kWh)
+
+    Returns:
+        Tuple of (final_soc, feasible, total_charged_kwh, total_discharged_kwh,
+        blocking_pos). When infeasible, the energy totals are 0 and blocking_pos
+        is the position in ``slots`` where the SOC limit was hit; otherwise -1.
+    """
+    soc = soc0
+    total_ch = 0.0
+    total_dc = 0.0
+    min_step = e_per_slot * 0.1
+    n_usage = net_usage.shape[0]
+
+    for k in range(slots.shape[0]):
+        s = slots[k]
+        if kinds[k] == SLOT_CHARGE:
+            headroom = cap * (max_pct - soc) / 100
+            if headroom < min_step:
+                return soc, False, 0.0, 0.0, k  # Can't charge - battery full
+            energy = min(e_per_slot, headroom)
+            soc += (energy / cap) * 100
+            total_ch += energy
+        else:
+            available = cap * (soc - min_pct) / 100
+            # Net demand = predicted usage minus solar production in this slot
+            net = net_usage[s] if s < n_usage else 0.0
+            if net < 0:
+                # Excess solar: charge the battery during a discharge slot
+                headroom = cap * (max_pct - soc) / 100
+                charge_energy = min(-net, max(0.0, headroom), e_per_slot)
+                soc += (charge_energy / cap) * 100
+                total_ch += charge_energy
+            else:
+                if available < min_step:
+                    return soc, False, 0.0, 0.0, k  # Can't discharge - battery empty
+                discharge_energy = min(net, available)
+                soc -= (discharge_energy / cap) * 100
+                total_dc += discharge_energy
+
+    return soc, True, total_ch, total_dc, -1
@@ -0,0 +1,76 @@
+"""Compiled dynamic program for thermal device scheduling.
+
+``solve_thermal_starts`` finds the cheapest set of block starts for a heat pump
+or hot water device in O(n * K), where K is the maximum distance between two
+consecutive starts. The thermal MILP only constrains consecutive starts, the
+first and the last start and the locked starts, so a shortest path over start
+positions solves it exactly. It is compiled with Numba when available (see
+``_jit``).
+"""
+import numpy as np
+
+from ._jit import njit
+
+
+@njit(cache=True)
+def solve_thermal_starts(costs, min_sep, max_sep, first_max, last_min, allow_empty, locked):
+    """Select block starts minimizing total cost.
+
+    Args:
+        costs: float64 array with the cost of a block starting at each valid start
+        min_sep: Minimum distance between consecutive starts (inclusive)
+        max_sep: Maximum distance between consecutive starts (inclusive)
+        first_max: The first start must be at or before this index
+        last_min: The last start must be at or after this index
+        allow_empty: Whether a schedule without any start is valid
+        locked: bool array marking starts that must be selected
+
+    Returns:
+        Tuple of (feasible, start indices in time order).
+    """
+    n = costs.shape[0]
+    best = np.full(n, np.inf)
+    parent = np.full(n, -1, dtype=np.int64)
+    prev_lock = -1
+
+    for i in range(n):
+        # A start may be the first one only if no locked start precedes it
+        if i <= first_max and prev_lock < 0:
+            best[i] = costs[i]
+        # Predecessors may not skip over a locked start
+        lo = max(i - max_sep, 0)
+        if prev_lock > lo:
+            lo = prev_lock
+        for j in range(lo, i - min_sep + 1):
+            cand = best[j] + costs[i]
+            if cand < best[i]:
+                best[i] = cand
+                parent[i] = j
+        if locked[i]:
+            prev_lock = i
+
+    # The last start must cover the end of the horizon and may not precede a lock
+    end = -1
+    end_cost = np.inf
+    for i in range(max(last_min, prev_lock, 0), n):
+        if best[i] < end_cost:
+            end_cost = best[i]
+            end = i
+
+    if allow_empty and not end_cost < 0.0:
+        return True, np.empty(0, dtype=np.int64)
+    if end < 0:
+        return False, np.empty(0, dtype=np.int64)
+
+    count = 0
+    i = end
+    while i >= 0:
+        count += 1
+        i = parent[i]
+    starts = np.empty(count, dtype=np.int64)
+    i = end
+    while i >= 0:
+        count -= 1
+        starts[count] = i
+        i = parent[i]
+    return True, starts
@@ -9,13 +9,107 @@ The optimization:
 - Uses price difference logic for opportunistic charging/discharging
 """
 import logging
+from functools import lru_cache
+
 import numpy as np
 
+from ._battery_numba import select_battery_slots
+from ._slot_times import slot_time_table
+
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=8)
+def _horizon_percentiles(price_bytes: bytes) -> tuple[float, float]:
+    """Return the 30th and 70th percentile of a horizon's prices.
+
+    Both fallback thresholds come from one percentile call, and the result is
+    cached on the raw float64 price buffer so the charge and discharge
+    optimizers (and every battery device) share it within a round.
+    """
+    p30, p70 = np.percentile(np.frombuffer(price_bytes, dtype=np.float64), [30, 70])
+    return float(p30), float(p70)
+
+
+def _charge_threshold(p: np.ndarray, max_charge_price: float | None) -> float:
+    """Return the charge threshold, falling back to the 30th horizon percentile."""
+    if max_charge_price is None:
+        # Fallback: use 30th percentile of current horizon prices
+        max_charge_price = _horizon_percentiles(p.tobytes())[0]
+        logger.info(f"🔋 Battery charge: using fallback threshold {max_charge_price:.4f} EUR/kWh (30th percentile of horizon)")
+    else:
+        logger.info(f"🔋 Battery charge: using historical threshold {max_charge_price:.4f} EUR/kWh")
+    return float(max_charge_price)
+
+
+def _discharge_threshold(p: np.ndarray, min_discharge_price: float | None) -> float:
+    """Return the discharge threshold, falling back to the 70th horizon percentile."""
+    if min_discharge_price is None:
+        # Fallback: use 70th percentile of current horizon prices
+        min_discharge_price = _horizon_percentiles(p.tobytes())[1]
+        logger.info(f"🔋 Battery discharge: using fallback threshold {min_discharge_price:.4f} EUR/kWh (70th percentile of horizon)")
+    else:
+        logger.info(f"🔋 Battery discharge: using historical threshold {min_discharge_price:.4f} EUR/kWh")
+    return float(min_discharge_price)
+
+
+def _discharge_reference(p: np.ndarray, reference_min_price: float | None) -> float:
+    """Return the reference minimum price for the discharge price difference logic.
+
+    Uses reference_min_price if provided (from previous optimization), otherwise
+    the current horizon min.
+    """
+    if reference_min_price is not None:
+        logger.info(f"🔋 Battery discharge: using preserved reference min price {reference_min_price:.4f} EUR/kWh")
+        return reference_min_price
+    min_price = float(p.min())
+    logger.info(f"🔋 Battery discharge: using current horizon min price {min_price:.4f} EUR/kWh")
+    return min_price
+
+
+def _diff_threshold(price_difference_threshold: float | None) -> float:
+    """Return the price difference threshold as a float (0 disables the logic)."""
+    return float(price_difference_threshold) if price_difference_threshold is not None else 0.0
+
+
+def _log_charge_selection(p: np.ndarray, slots: np.ndarray, max_charge_price: float,
+                          n_below: int, diff_thresh: float) -> None:
+    """Log how many charge slots were selected and at which prices."""
+    logger.info(f"🔋 Battery charge: initially {n_below} eligible slots below threshold {max_charge_price:.4f} EUR/kWh")
+    if diff_thresh > 0:
+        logger.info(f"🔋 Battery charge: applying price difference threshold {diff_thresh:.4f} EUR/kWh")
+        logger.info(f"🔋 Battery charge: after price difference logic, {len(slots)} eligible slots")
+    
+    if slots.size == 0:
+        logger.warning(f"⚠️ No slots below max_charge_price={max_charge_price:.4f} EUR/kWh")
+        return
+    
+    selected_prices = p[slots]
+    avg_charge_price = selected_prices.sum() / len(slots)
+    logger.info(f"💰 Battery charge: selected {len(slots)} eligible slots "
+               f"(avg={avg_charge_price:.4f}, range={selected_prices.min():.4f}-{selected_prices.max():.4f} EUR/kWh)")
+
+
+def _log_discharge_selection(p: np.ndarray, slots: np.ndarray, min_discharge_price: float,
+                             n_above: int, diff_thresh: float) -> None:
+    """Log how many discharge slots were selected and at which prices."""
+    logger.info(f"🔋 Battery discharge: initially {n_above} eligible slots above threshold {min_discharge_price:.4f} EUR/kWh")
+    if diff_thresh > 0:
+        logger.info(f"🔋 Battery discharge: applying price difference threshold {diff_thresh:.4f} EUR/kWh")
+        logger.info(f"🔋 Battery discharge: after price difference logic, {len(slots)} eligible slots")
+    
+    if slots.size == 0:
+        logger.warning(f"⚠️ No slots above min_discharge_price={min_discharge_price:.4f} EUR/kWh")
+        return
+    
+    selected_prices = p[slots]
+    avg_discharge_price = selected_prices.sum() / len(slots)
+    logger.info(f"💰 Battery discharge: selected {len(slots)} eligible slots "
+               f"(avg={avg_discharge_price:.4f}, range={selected_prices.min():.4f}-{selected_prices.max():.4f} EUR/kWh)")
+
+
 def optimize_battery(
-    prices: list[float], 
+    prices: np.ndarray | list[float], 
     slot_minutes: int, 
     slot_to_time,
     max_charge_price: float | None = None, 
@@ -26,7 +120,7 @@ def optimize_battery(
     Returns all eligible charging slots (limiting is done in limit_battery_cycles).
     
     Args:
-        prices: List of prices per slot
+        prices: Prices per slot as ndarray or list
         slot_minutes: Duration of each slot in minutes
         slot_to_time: Function to convert slot index to time string
         max_charge_price: Maximum price threshold for charging (from historical percentile).
@@ -37,58 +131,24 @@ def optimize_battery(
     Returns:
         List of start times for battery charging as HH:MM strings
     """
-    if not prices:
+    p = np.ascontiguousarray(prices, dtype=np.float64)
+    if p.size == 0:
         return []
     
-    # Use provided max_charge_price or calculate fallback from current horizon
-    if max_charge_price is None:
-        # Fallback: use 30th percentile of current horizon prices
-        max_charge_price = float(np.percentile(prices, 30))
-        logger.info(f"🔋 Battery charge: using fallback threshold {max_charge_price:.4f} EUR/kWh (30th percentile of horizon)")
-    else:
-        logger.info(f"🔋 Battery charge: using historical threshold {max_charge_price:.4f} EUR/kWh")
-    
-    # Filter slots that are below the max charge price threshold
-    eligible_slots = [(i, prices[i]) for i in range(len(prices)) if prices[i] <= max_charge_price]
-    logger.info(f"🔋 Battery charge: initially {len(eligible_slots)} eligible slots below threshold {max_charge_price:.4f} EUR/kWh")
-
-    # Add price difference logic: mark slots as charge slots if there's a future slot more expensive by threshold
-    if price_difference_threshold is not None and price_difference_threshold > 0:
-        logger.info(f"🔋 Battery charge: applying price difference threshold {price_difference_threshold:.4f} EUR/kWh")
-        for i in range(len(prices)):
-            current_price = prices[i]
-            # Check if any future slot is more expensive by at least the threshold
-            has_expensive_future = any(
-                prices[j] >= current_price + price_difference_threshold 
-                for j in range(i + 1, len(prices))
-            )
-            if has_expensive_future:
-                # Add to eligible slots if not already there
-                if not any(slot_idx == i for slot_idx, _ in eligible_slots):
-                    eligible_slots.append((i, current_price))
-        logger.info(f"🔋 Battery charge: after price difference logic, {len(eligible_slots)} eligible slots")
-    
-    if not eligible_slots:
-        logger.warning(f"⚠️ No slots below max_charge_price={max_charge_price:.4f} EUR/kWh")
-        return []
+    max_charge_price = _charge_threshold(p, max_charge_price)
+    diff_thresh = _diff_threshold(price_difference_threshold)
     
-    # Sort by price and return all eligible slots (limiting is done later)
-    eligible_slots.sort(key=lambda x: x[1])
-    selected_slots = [slot for slot, _ in eligible_slots]
+    # Threshold filter and price difference logic (mark slots as charge slots if there's a
+    # future slot more expensive by threshold); the discharge side is disabled with NaN
+    charge_slots, n_below, _, _ = select_battery_slots(p, max_charge_price, np.nan, diff_thresh, np.nan)
+    _log_charge_selection(p, charge_slots, max_charge_price, n_below, diff_thresh)
     
-    # Log selection info
-    if selected_slots:
-        avg_charge_price = sum(prices[i] for i in selected_slots) / len(selected_slots)
-        min_price = min(prices[i] for i in selected_slots)
-        max_selected_price = max(prices[i] for i in selected_slots)
-        logger.info(f"💰 Battery charge: selected {len(selected_slots)} eligible slots "
-                   f"(avg={avg_charge_price:.4f}, range={min_price:.4f}-{max_selected_price:.4f} EUR/kWh)")
-    
-    return [slot_to_time(i, slot_minutes) for i in sorted(selected_slots)]
+    time_strs = slot_time_table(slot_to_time, slot_minutes, len(p))
+    return [time_strs[i] for i in charge_slots.tolist()]
 
 
 def optimize_bat_discharge(
-    prices: list[float], 
+    prices: np.ndarray | list[float], 
     slot_minutes: int, 
     slot_to_time,
     min_discharge_price: float | None = None, 
@@ -100,7 +160,7 @@ def optimize_bat_discharge(
     Returns all eligible discharge slots (limiting is done in limit_battery_cycles).
     
     Args:
-        prices: List of prices per slot
+        prices: Prices per slot as ndarray or list
         slot_minutes: Duration of each slot in minutes
         slot_to_time: Function to convert slot index to time string
         min_discharge_price: Minimum price threshold for discharging (from historical percentile).
@@ -117,64 +177,72 @@ def optimize_bat_discharge(
             - List of start times for battery discharge as HH:MM strings
             - Dict with price context (min_price_used) for storing with schedule
     """
-    if not prices:
+    p = np.ascontiguousarray(prices, dtype=np.float64)
+    if p.size == 0:
         return [], {'min_price_used': None}
     
-    # Use provided min_discharge_price or calculate fallback from current horizon
-    if min_discharge_price is None:
-        # Fallback: use 70th percentile of current horizon prices
-        min_discharge_price = float(np.percentile(prices, 70))
-        logger.info(f"🔋 Battery discharge: using fallback threshold {min_discharge_price:.4f} EUR/kWh (70th percentile of horizon)")
-    else:
-        logger.info(f"🔋 Battery discharge: using historical threshold {min_discharge_price:.4f} EUR/kWh")
+    min_discharge_price = _discharge_threshold(p, min_discharge_price)
+    min_price_for_threshold = _discharge_reference(p, reference_min_price)
+    diff_thresh = _diff_threshold(price_difference_threshold)
     
-    # Filter slots that are above the min discharge price threshold
-    eligible_slots = [(i, prices[i]) for i in range(len(prices)) if prices[i] >= min_discharge_price]
-    logger.info(f"🔋 Battery discharge: initially {len(eligible_slots)} eligible slots above threshold {min_discharge_price:.4f} EUR/kWh")
-    
-    # Calculate the reference minimum price for price difference logic
-    # Use reference_min_price if provided (from previous optimization), otherwise use current horizon min
-    if reference_min_price is not None:
-        min_price_for_threshold = reference_min_price
-        logger.info(f"🔋 Battery discharge: using preserved reference min price {min_price_for_threshold:.4f} EUR/kWh")
-    else:
-        min_price_for_threshold = min(prices) if prices else 0
-        logger.info(f"🔋 Battery discharge: using current horizon min price {min_price_for_threshold:.4f} EUR/kWh")
-    
-    # Add price difference logic: mark slots as discharge slots if they are more expensive than the reference min by threshold
-    if price_difference_threshold is not None and price_difference_threshold > 0:
-        logger.info(f"🔋 Battery discharge: applying price difference threshold {price_difference_threshold:.4f} EUR/kWh")
-        for i in range(len(prices)):
-            current_price = prices[i]
-            # Check if this slot is more expensive than the reference min price by at least the threshold
-            # This preserves discharge decisions even when the low prices have passed in the horizon
-            is_expensive_compared_to_reference = current_price >= min_price_for_threshold + price_difference_threshold
-            
-            if is_expensive_compared_to_reference:
-                # Add to eligible slots if not already there
-                if not any(slot_idx == i for slot_idx, _ in eligible_slots):
-                    eligible_slots.append((i, current_price))
-        logger.info(f"🔋 Battery discharge: after price difference logic, {len(eligible_slots)} eligible slots")
+    # Threshold filter and price difference logic (mark slots as discharge slots if they are
+    # more expensive than the reference min by threshold); the charge side is disabled with NaN
+    _, _, discharge_slots, n_above = select_battery_slots(p, np.nan, min_discharge_price, diff_thresh, float(min_price_for_threshold))
+    _log_discharge_selection(p, discharge_slots, min_discharge_price, n_above, diff_thresh)
     
     # Return both the times and the price context for storage
     price_context = {
         'min_price_used': min_price_for_threshold
     }
     
-    if not eligible_slots:
-        logger.warning(f"⚠️ No slots above min_discharge_price={min_discharge_price:.4f} EUR/kWh")
-        return [], price_context
-    
-    # Sort by price descending and return all eligible slots (limiting is done later)
-    eligible_slots.sort(key=lambda x: x[1], reverse=True)
-    selected_slots = [slot for slot, _ in eligible_slots]
-    
-    # Log selection info
-    if selected_slots:
-        avg_discharge_price = sum(prices[i] for i in selected_slots) / len(selected_slots)
-        min_selected_price = min(prices[i] for i in selected_slots)
-        max_price = max(prices[i] for i in selected_slots)
-        logger.info(f"💰 Battery discharge: selected {len(selected_slots)} eligible slots "
-                   f"(avg={avg_discharge_price:.4f}, range={min_selected_price:.4f}-{max_price:.4f} EUR/kWh)")
+    time_strs = slot_time_table(slot_to_time, slot_minutes, len(p))
+    return [time_strs[i] for i in discharge_slots.tolist()], price_context
+
+
+def optimize_battery_schedule(
+    prices: np.ndarray | list[float],
+    slot_minutes: int,
+    slot_to_time,
+    max_charge_price: float | None = None,
+    min_discharge_price: float | None = None,
+    price_difference_threshold: float | None = None,
+    reference_min_price: float | None = None
+) -> tuple[list[str], list[str], dict]:
+    """
+    Optimize battery charge and discharge periods in a single pass over the prices.
+    Equivalent to calling optimize_battery and optimize_bat_discharge with the same
+    arguments, but both selections share one scan of the horizon.
     
-    return [slot_to_time(i, slot_minutes) for i in sorted(selected_slots)], price_context
+    Args:
+        prices: Prices per slot as ndarray or list
+        slot_minutes: Duration of each slot in minutes
+        slot_to_time: Function to convert slot index to time string
+        max_charge_price: See optimize_battery
+        min_discharge_price: See optimize_bat_discharge
+        price_difference_threshold: Price difference threshold for both directions
+        reference_min_price: See optimize_bat_discharge
+        
+    Returns:
+        Tuple of (charge times, discharge times, price context dict)
+    """
+    p = np.ascontiguousarray(prices, dtype=np.float64)
+    if p.size == 0:
+        return [], [], {'min_price_used': None}
+    
+    max_charge_price = _charge_threshold(p, max_charge_price)
+    min_discharge_price = _discharge_threshold(p, min_discharge_price)
+    min_price_for_threshold = _discharge_reference(p, reference_min_price)
+    diff_thresh = _diff_threshold(price_difference_threshold)
+    
+    charge_slots, n_below, discharge_slots, n_above = select_battery_slots(
+        p, max_charge_price, min_discharge_price, diff_thresh, float(min_price_for_threshold)
+    )
+    _log_charge_selection(p, charge_slots, max_charge_price, n_below, diff_thresh)
+    _log_discharge_selection(p, discharge_slots, min_discharge_price, n_above, diff_thresh)
+    
+    time_strs = slot_time_table(slot_to_time, slot_minutes, len(p))
+    return (
+        [time_strs[i] for i in charge_slots.tolist()],
+        [time_strs[i] for i in discharge_slots.tolist()],
+        {'min_price_used': min_price_for_threshold},
+    )
@@ -6,17 +6,21 @@ This module implements SOC-aware battery cycle limiting that:
 - Respects min/max SOC constraints
 - Simulates battery state over time to ensure feasibility
 """
+import bisect
 import logging
 from datetime import datetime, timedelta
 
+import numpy as np
+
 from ..config import CONFIG
+from ._soc_numba import simulate_soc_nb, SLOT_CHARGE, SLOT_DISCHARGE
 
 logger = logging.getLogger(__name__)
 
 
 def limit_battery_cycles(
-    charge_times: list[str],
-    discharge_times: list[str],
+    charge_slots: list[int],
+    discharge_slots: list[int],
     slot_minutes: int,
     horizon_start: datetime,
     current_soc: float | None,
@@ -24,13 +28,13 @@ def limit_battery_cycles(
     battery_charge_speed_kw: float,
     min_soc_percent: float,
     max_soc_percent: float,
-    prices: list[float] | None = None,
+    prices: np.ndarray | list[float] | None = None,
     predicted_power_usage: list[dict] | None = None,
     predicted_solar: list[dict] | None = None,
     device_name: str = "battery",
-    previous_limited_charge_times: list[str] | None = None,
-    previous_limited_discharge_times: list[str] | None = None,
-) -> tuple[list[str], list[str]]:
+    previous_limited_charge_slots: list[int] | None = None,
+    previous_limited_discharge_slots: list[int] | None = None,
+) -> tuple[list[int], list[int]]:
     """
     Limit battery charge and discharge times based on battery capacity and SOC constraints.
     
@@ -38,8 +42,8 @@ def limit_battery_cycles(
     while respecting SOC constraints over time.
     
     Args:
-        charge_times: List of charge start times (strings like "HH:MM")
-        discharge_times: List of discharge start times (strings like "HH:MM") 
+        charge_slots: Charge slot indices relative to horizon_start
+        discharge_slots: Discharge slot indices relative to horizon_start
         slot_minutes: Duration of each slot in minutes
         horizon_start: datetime when the horizon starts
         current_soc: Current battery state of charge in percent (0-100), or None
@@ -47,211 +51,270 @@ def limit_battery_cycles(
         battery_charge_speed_kw: Battery charge speed in kW
         min_soc_percent: Minimum battery SOC in percent
         max_soc_percent: Maximum battery SOC in percent
-        prices: List of prices per slot (used to prioritize cheap charge / expensive discharge)
+        prices: Prices per slot as ndarray or list (used to prioritize cheap charge / expensive discharge)
         predicted_power_usage: List of dicts with 'timestamp' and 'predicted_kwh' keys, or None
         predicted_solar: List of dicts with 'timestamp' and 'predicted_kwh' keys for solar
             production per slot, or None. Solar production reduces net household demand from
             the battery during discharge slots.
         device_name: Name for logging purposes
-        previous_limited_charge_times: Previously limited charge times (HH:MM strings) used to
-            determine which past slots to preserve. If None, falls back to charge_times.
-        previous_limited_discharge_times: Previously limited discharge times (HH:MM strings) used to
-            determine which past slots to preserve. If None, falls back to discharge_times.
+        previous_limited_charge_slots: Previously limited charge slot indices used to
+            determine which past slots to preserve. If None, falls back to charge_slots.
+        previous_limited_discharge_slots: Previously limited discharge slot indices used to
+            determine which past slots to preserve. If None, falls back to discharge_slots.
 
     Returns:
-        Tuple of (limited_charge_times, limited_discharge_times)
+        Tuple of (limited_charge_slots, limited_discharge_slots), sorted slot indices
     """
-    logger.info(f"🔋 {device_name}: Input charge_times: {charge_times}")
-    if not charge_times and not discharge_times:
+    logger.info(f"🔋 {device_name}: Input charge_slots: {charge_slots}")
+    if not charge_slots and not discharge_slots:
         return [], []
     
+    # Normalize prices once; an empty array means "no prices" (time order only)
+    p_arr = np.ascontiguousarray(prices if prices is not None else [], dtype=np.float64)
+    n_prices = len(p_arr)
+    
     # Use current SOC or assume 0 % charged
     if current_soc is None:
         current_soc = 0
         logger.warning(f"⚠️ {device_name}: No SOC available, assuming {current_soc:.1f}%")
     
-    # Helper: convert time string to slot index
-    # Time strings are in HH:MM format relative to horizon_start (can exceed 23 hours)
-    def time_to_slot_idx(time_str):
-        hour, minute = map(int, time_str.split(':'))
-        total_minutes = hour * 60 + minute
-        return total_minutes // slot_minutes
-    
-    def slot_idx_to_time(slot_idx):
-        total_minutes = slot_idx * slot_minutes
-        return f"{total_minutes // 60:02d}:{total_minutes % 60:02d}"
-    
     # Calculate current slot index to separate past from future
     now = datetime.now().replace(tzinfo=None)
     current_slot_idx = int((now - horizon_start).total_seconds() / 60 / slot_minutes)
     
-    # Convert to slot indices
-    charge_slots = {time_to_slot_idx(t) for t in charge_times} if charge_times else set()
-    discharge_slots = {time_to_slot_idx(t) for t in discharge_times} if discharge_times else set()
+    charge_slots = set(charge_slots or ())
+    discharge_slots = set(discharge_slots or ())
 
     # Past slots are taken from the previously limited schedule so that we preserve
     # what was actually planned, not what the optimizer re-suggests for the past.
     prev_charge_slots = (
-        {time_to_slot_idx(t) for t in previous_limited_charge_times}
-        if previous_limited_charge_times is not None
+        set(previous_limited_charge_slots)
+        if previous_limited_charge_slots is not None
         else charge_slots
     )
     prev_discharge_slots = (
-        {time_to_slot_idx(t) for t in previous_limited_discharge_times}
-        if previous_limited_discharge_times is not None
+        set(previous_limited_discharge_slots)
+        if previous_limited_discharge_slots is not None
         else discharge_slots
     )
 
+    # Slot sets are handled as boolean bitmaps over all referenced slots so that
+    # past/future splitting, conflict resolution and membership are array operations
+    n_bmp = max(charge_slots | discharge_slots | prev_charge_slots | prev_discharge_slots, default=-1) + 1
+
+    def to_bitmap(slots):
+        bmp = np.zeros(n_bmp, dtype=np.bool_)
+        bmp[np.fromiter(slots, dtype=np.int64, count=len(slots))] = True
+        return bmp
+
+    def bitmap_to_slots(bmp):
+        return np.flatnonzero(bmp).tolist()
+
+    is_past = np.arange(n_bmp) < current_slot_idx
+
     # Separate past and future slots - preserve all past slots unchanged
-    past_charge_slots = {s for s in prev_charge_slots if s < current_slot_idx}
-    past_discharge_slots = {s for s in prev_discharge_slots if s < current_slot_idx}
-    future_charge_slots = {s for s in charge_slots if s >= current_slot_idx}
-    future_discharge_slots = {s for s in discharge_slots if s >= current_slot_idx}
+    past_charge_bmp = to_bitmap(prev_charge_slots) & is_past
+    past_discharge_bmp = to_bitmap(prev_discharge_slots) & is_past
     
-    logger.info(f"🔋 {device_name}: Preserving {len(past_charge_slots)} past charge slots and {len(past_discharge_slots)} past discharge slots")
+    logger.info(f"🔋 {device_name}: Preserving {np.count_nonzero(past_charge_bmp)} past charge slots and {np.count_nonzero(past_discharge_bmp)} past discharge slots")
     
     # Only process future slots
-    charge_slots = future_charge_slots
-    discharge_slots = future_discharge_slots
+    charge_bmp = to_bitmap(charge_slots) & ~is_past
+    discharge_bmp = to_bitmap(discharge_slots) & ~is_past
     
     # Resolve conflicts - this shouldn't happen, but just in case
-    conflicts = charge_slots & discharge_slots
-    if conflicts:
-        logger.warning(f"⚠️ {device_name}: {len(conflicts)} slots have both charge and discharge, prioritizing discharge")
-        charge_slots -= conflicts
+    conflicts = charge_bmp & discharge_bmp
+    if conflicts.any():
+        logger.warning(f"⚠️ {device_name}: {np.count_nonzero(conflicts)} slots have both charge and discharge, prioritizing discharge")
+        charge_bmp &= ~conflicts
     
-    if not charge_slots and not discharge_slots:
+    if not charge_bmp.any() and not discharge_bmp.any():
         # No future slots to process - return past slots unchanged
-        limited_charge_times = sorted([slot_idx_to_time(s) for s in past_charge_slots])
-        limited_discharge_times = sorted([slot_idx_to_time(s) for s in past_discharge_slots])
-        logger.info(f"🔋 {device_name}: No future slots, preserving {len(limited_charge_times)} past charge and {len(limited_discharge_times)} past discharge slots")
-        return limited_charge_times, limited_discharge_times
+        limited_charge_slots = bitmap_to_slots(past_charge_bmp)
+        limited_discharge_slots = bitmap_to_slots(past_discharge_bmp)
+        logger.info(f"🔋 {device_name}: No future slots, preserving {len(limited_charge_slots)} past charge and {len(limited_discharge_slots)} past discharge slots")
+        return limited_charge_slots, limited_discharge_slots
+    
+    # Future candidate slots in time order
+    cs = np.flatnonzero(charge_bmp)
+    ds = np.flatnonzero(discharge_bmp)
     
     # Energy per slot when charging at full speed
     slot_hours = slot_minutes / 60
     charge_energy_per_slot = battery_charge_speed_kw * slot_hours
     
-    # Build predicted usage lookup (slot_idx -> kWh usage per slot)
-    # Apply discharge buffer to reduce predicted usage
-    usage_by_slot = {}
-
-    def _pred_time_to_slot(pred_time_raw):
-        """Parse a prediction timestamp and return its slot index."""
+    def _pred_naive_time(pred_time_raw):
+        """Parse a prediction timestamp and strip its timezone."""
         t = pred_time_raw
         if isinstance(t, str):
             t = datetime.fromisoformat(t.replace('Z', '+00:00'))
         if hasattr(t, 'replace'):
             t = t.replace(tzinfo=None)
-        return int((t - horizon_start).total_seconds() / 60 / slot_minutes)
+        return t
+
+    def _pred_arrays(preds):
+        """Convert predictions to parallel (slot index, kWh) arrays.
+
+        Timestamps are converted in one pass. Predictions before horizon_start
+        are dropped, and when several predictions map to the same slot the
+        last one wins.
+        """
+        times = np.array([_pred_naive_time(pred['timestamp']) for pred in preds], dtype='datetime64[us]')
+        kwh = np.fromiter((pred['predicted_kwh'] for pred in preds), dtype=np.float64, count=len(preds))
+        seconds = (times - np.datetime64(horizon_start, 'us')) / np.timedelta64(1, 's')
+        # astype truncates toward zero like int() did for the per-slot conversion
+        slots = (seconds / 60 / slot_minutes).astype(np.int64)
+        # Index of the last occurrence of every slot, in slot order
+        _, last_rev = np.unique(slots[::-1], return_index=True)
+        keep = len(slots) - 1 - last_rev
+        keep = keep[slots[keep] >= 0]
+        return slots[keep], kwh[keep]
+
+    # Per-slot debug messages are only formatted when they will actually be emitted
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
 
+    # Predicted usage per slot (kWh), reduced by the discharge buffer
+    # Note: predicted_kwh is already per-slot kWh (converted upstream)
+    usage_slots = np.empty(0, dtype=np.int64)
+    usage_kwh = np.empty(0, dtype=np.float64)
     if predicted_power_usage:
         discharge_buffer_percent = CONFIG['options'].get('battery_discharge_buffer_percent', 20)
         discharge_buffer_multiplier = 1.0 - (discharge_buffer_percent / 100.0)
-        for pred in predicted_power_usage:
-            slot_idx = _pred_time_to_slot(pred['timestamp'])
-            if slot_idx >= 0:
-                # Reduce predicted usage by the discharge buffer percentage
-                # Note: pred['predicted_kwh'] is already per-slot kWh (converted upstream)
-                logger.debug(f"🔋 {device_name}: Predicted usage for slot {slot_idx} before buffer: {pred['predicted_kwh']:.2f} kWh")
-                usage_by_slot[slot_idx] = pred['predicted_kwh'] * discharge_buffer_multiplier
+        usage_slots, usage_kwh = _pred_arrays(predicted_power_usage)
+        if debug_enabled:
+            for slot_idx, kwh in zip(usage_slots.tolist(), usage_kwh.tolist()):
+                logger.debug(f"🔋 {device_name}: Predicted usage for slot {slot_idx} before buffer: {kwh:.2f} kWh")
+        usage_kwh = usage_kwh * discharge_buffer_multiplier
 
-    # Build predicted solar production lookup (slot_idx -> kWh solar per slot)
+    # Predicted solar production per slot (kWh)
     # Solar production reduces the net household demand that the battery needs to cover.
-    # Note: pred['predicted_kwh'] is already per-slot kWh (converted upstream)
-    solar_by_slot = {}
+    solar_slots = np.empty(0, dtype=np.int64)
+    solar_kwh = np.empty(0, dtype=np.float64)
     if predicted_solar:
-        for pred in predicted_solar:
-            slot_idx = _pred_time_to_slot(pred['timestamp'])
-            if slot_idx >= 0:
-                solar_by_slot[slot_idx] = pred['predicted_kwh']
+        solar_slots, solar_kwh = _pred_arrays(predicted_solar)
 
-    if solar_by_slot:
-        logger.debug(f"☀️ {device_name}: Solar production data available for {len(solar_by_slot)} slots")
+    if solar_slots.size:
+        logger.debug(f"☀️ {device_name}: Solar production data available for {solar_slots.size} slots")
     
     # Sort charge slots by price (cheapest first), discharge by price (most expensive first)
-    if prices:
-        charge_by_price = sorted(charge_slots, key=lambda s: prices[s] if s < len(prices) else float('inf'))
-        discharge_by_price = sorted(discharge_slots, key=lambda s: -prices[s] if s < len(prices) else float('-inf'))
+    # Slots without a price sort last for charging and first for discharging;
+    # equal prices keep their time order.
+    if n_prices:
+        charge_keys = np.full(len(cs), np.inf)
+        in_range = cs < n_prices
+        charge_keys[in_range] = p_arr[cs[in_range]]
+        discharge_keys = np.full(len(ds), -np.inf)
+        in_range = ds < n_prices
+        discharge_keys[in_range] = -p_arr[ds[in_range]]
+        charge_by_price = cs[np.argsort(charge_keys, kind='stable')].tolist()
+        discharge_by_price = ds[np.argsort(discharge_keys, kind='stable')].tolist()
     else:
         # Without prices, just use time order
-        charge_by_price = sorted(charge_slots)
-        discharge_by_price = sorted(discharge_slots)
+        charge_by_price = cs.tolist()
+        discharge_by_price = ds.tolist()
     
-    def simulate_soc(selected_charge, selected_discharge):
+    # Dense per-slot net demand (usage minus solar) for the compiled SOC kernel
+    n_candidate_slots = max(cs[-1] if cs.size else -1, ds[-1] if ds.size else -1) + 1
+    net_usage = np.zeros(n_candidate_slots, dtype=np.float64)
+    in_range = usage_slots < n_candidate_slots
+    net_usage[usage_slots[in_range]] += usage_kwh[in_range]
+    in_range = solar_slots < n_candidate_slots
+    net_usage[solar_slots[in_range]] -= solar_kwh[in_range]
 
-        """Simulate SOC over time and return final SOC, feasibility, and energy statistics."""
-        
-        all_slots = sorted(selected_charge | selected_discharge)  # Sort over time
-        soc = current_soc
-        total_charged_kwh = 0
-        total_discharged_kwh = 0
-        
-        for slot_idx in all_slots:
-            if slot_idx in selected_charge:
-                headroom = battery_capacity_kwh * (max_soc_percent - soc) / 100
-                if headroom < charge_energy_per_slot * 0.1:
-                    return None, False, 0, 0  # Can't charge - battery full
-                energy = min(charge_energy_per_slot, headroom)
-                soc += (energy / battery_capacity_kwh) * 100
-                total_charged_kwh += energy
-            elif slot_idx in selected_discharge:
-                available = battery_capacity_kwh * (soc - min_soc_percent) / 100
-                # Net demand = predicted usage minus solar production in this slot.
-                # Solar covers part of household demand, reducing how much the battery needs to discharge.
-                gross_usage = usage_by_slot.get(slot_idx, 0)
-                solar_offset = solar_by_slot.get(slot_idx, 0)
-                net_usage = gross_usage - solar_offset
-                if net_usage < 0:
-                    # Excess solar: charge the battery during a discharge slot
-                    headroom = battery_capacity_kwh * (max_soc_percent - soc) / 100
-                    charge_energy = min(-net_usage, max(0.0, headroom), charge_energy_per_slot)
-                    soc += (charge_energy / battery_capacity_kwh) * 100
-                    total_charged_kwh += charge_energy
-                else:
-                    if available < charge_energy_per_slot * 0.1:
-                        return None, False, 0, 0  # Can't discharge - battery empty
-                    discharge_energy = min(net_usage, available)
-                    soc -= (discharge_energy / battery_capacity_kwh) * 100
-                    total_discharged_kwh += discharge_energy
-        
-        return soc, True, total_charged_kwh, total_discharged_kwh
+    # Selected slots kept in time order as parallel slot/kind lists, updated with
+    # bisect on insertion so each simulation walks an already-sorted sequence.
+    sorted_slots: list[int] = []
+    sorted_kinds: list[int] = []
+
+    def insert_slot(slot_idx, kind):
+        """Insert a slot into the time-ordered selection and return its position."""
+        pos = bisect.bisect_left(sorted_slots, slot_idx)
+        sorted_slots.insert(pos, slot_idx)
+        sorted_kinds.insert(pos, kind)
+        return pos
+
+    def remove_slot(pos):
+        """Remove the slot at the given position from the time-ordered selection."""
+        del sorted_slots[pos]
+        del sorted_kinds[pos]
+
+    def simulate_soc():
+        """Simulate SOC over the current selection.
+
+        Returns final SOC, feasibility, energy statistics, and (when infeasible)
+        a ``(slot_idx, battery_full)`` tuple describing where the SOC limit was hit.
+        """
+        soc, feasible, total_charged_kwh, total_discharged_kwh, blocking_pos = simulate_soc_nb(
+            np.array(sorted_slots, dtype=np.int64), np.array(sorted_kinds, dtype=np.int8),
+            net_usage, float(current_soc), float(battery_capacity_kwh),
+            float(min_soc_percent), float(max_soc_percent), float(charge_energy_per_slot),
+        )
+        if not feasible:
+            blocked = (sorted_slots[blocking_pos], sorted_kinds[blocking_pos] == SLOT_CHARGE)
+            return None, False, 0, 0, blocked
+        return soc, True, total_charged_kwh, total_discharged_kwh, None
     
     # Greedy selection: add slots in price order if they keep the schedule feasible
-    selected_charge = set()
-    selected_discharge = set()
+    selected_charge = np.zeros(n_bmp, dtype=np.bool_)
+    selected_discharge = np.zeros(n_bmp, dtype=np.bool_)
+    # Rejected discharge slot -> (slot where the SOC limit was hit, battery full).
+    # The SOC only evolves forward in time and every slot moves it in one direction
+    # (charge and solar-surplus slots raise it, other discharge slots lower it), so a
+    # rejected slot can only become feasible after a slot is added at or before its
+    # blocking slot that moves the SOC away from the limit that was hit. Only those
+    # slots are marked stale and re-simulated.
+    rejected_discharge: dict[int, tuple[int, bool]] = {}
+    stale_discharge: set[int] = set()
+    # (final SOC, charged kWh, discharged kWh) of the current selection, updated on
+    # every accepted slot; rejected slots are removed again and leave it unchanged.
+    accepted_sim = (float(current_soc), 0.0, 0.0)
+
+    def price_str(slot_idx):
+        """Format the slot price suffix for log messages (empty without a price)."""
+        return f", price={p_arr[slot_idx]:.4f}" if slot_idx < n_prices else ""
+
+    def mark_stale(slot_idx, kind):
+        """Mark rejected discharge slots that an accepted slot could unblock."""
+        raises_soc = kind == SLOT_CHARGE or net_usage[slot_idx] < 0
+        for d_slot, (blocking_slot, battery_full) in rejected_discharge.items():
+            if slot_idx <= blocking_slot and raises_soc != battery_full:
+                stale_discharge.add(d_slot)
     
     logger.info(f"🔋 {device_name}: Starting SOC limiting - current_soc={current_soc:.1f}%, "
-                f"{len(charge_slots)} charge candidates, {len(discharge_slots)} discharge candidates")
+                f"{len(cs)} charge candidates, {len(ds)} discharge candidates")
     
     # First add discharge slots (most expensive first)
     logger.debug(f"🔋 {device_name}: Phase 1 - Adding discharge slots (most expensive first)")
     for slot_idx in discharge_by_price:
-        candidate = selected_discharge | {slot_idx}
-        slot_price = prices[slot_idx] if prices and slot_idx < len(prices) else None
-        final_soc, feasible, charged_kwh, discharged_kwh = simulate_soc(selected_charge, candidate)
+        pos = insert_slot(slot_idx, SLOT_DISCHARGE)
+        final_soc, feasible, charged_kwh, discharged_kwh, blocked = simulate_soc()
         if feasible:
-            selected_discharge = candidate
-            price_str = f", price={slot_price:.4f}" if slot_price is not None else ""
-            logger.debug(f"🔋 {device_name}: ✓ Added discharge slot {slot_idx}, final_soc={final_soc:.1f}%{price_str}")
+            selected_discharge[slot_idx] = True
+            mark_stale(slot_idx, SLOT_DISCHARGE)
+            accepted_sim = (final_soc, charged_kwh, discharged_kwh)
+            if debug_enabled:
+                logger.debug(f"🔋 {device_name}: ✓ Added discharge slot {slot_idx}, final_soc={final_soc:.1f}%{price_str(slot_idx)}")
         else:
-            price_str = f", price={slot_price:.4f}" if slot_price is not None else ""
-            logger.debug(f"🔋 {device_name}: ✗ Rejected discharge slot {slot_idx} (SOC constraint violated{price_str})")
+            remove_slot(pos)
+            rejected_discharge[slot_idx] = blocked
+            if debug_enabled:
+                logger.debug(f"🔋 {device_name}: ✗ Rejected discharge slot {slot_idx} (SOC constraint violated{price_str(slot_idx)})")
     
     # Get charge buffer percentage from config (default 20%)
     charge_buffer_percent = CONFIG['options'].get('battery_charge_buffer_percent', 20)
     
     logger.debug(f"🔋 {device_name}: Phase 2 - Adding charge slots (cheapest first, buffer={charge_buffer_percent}%)")
-    logger.debug(f"🔋 {device_name}: Initial state: {len(selected_discharge)} discharge slots selected")
+    logger.debug(f"🔋 {device_name}: Initial state: {np.count_nonzero(selected_discharge)} discharge slots selected")
     
     # Then add charge slots (cheapest first) - but only if economically viable
     for slot_idx in charge_by_price:
-        candidate = selected_charge | {slot_idx}
-        slot_price = prices[slot_idx] if prices and slot_idx < len(prices) else None
-        final_soc, feasible, charged_kwh, discharged_kwh = simulate_soc(candidate, selected_discharge)
+        pos = insert_slot(slot_idx, SLOT_CHARGE)
+        final_soc, feasible, charged_kwh, discharged_kwh, _ = simulate_soc()
         
         if not feasible:
-            price_str = f", price={slot_price:.4f}" if slot_price is not None else ""
-            logger.debug(f"🔋 {device_name}: ✗ Rejected charge slot {slot_idx} (SOC constraint violated{price_str})")
+            remove_slot(pos)
+            if debug_enabled:
+                logger.debug(f"🔋 {device_name}: ✗ Rejected charge slot {slot_idx} (SOC constraint violated{price_str(slot_idx)})")
             continue
         
         # Check if adding this charge slot is economically viable
@@ -259,53 +322,63 @@ def limit_battery_cycles(
         if discharged_kwh > 0:  # Only check if there are discharge slots
             max_charge_allowed = discharged_kwh * (1 + charge_buffer_percent / 100)
             if charged_kwh > max_charge_allowed:
-                price_str = f", price={slot_price:.4f}" if slot_price is not None else ""
-                logger.debug(f"🔋 {device_name}: ✗ Rejected charge slot {slot_idx} "
-                           f"(charged {charged_kwh:.2f} kWh would exceed discharge needs "
-                           f"{discharged_kwh:.2f} kWh + {charge_buffer_percent}% buffer = {max_charge_allowed:.2f} kWh{price_str})")
+                remove_slot(pos)
+                if debug_enabled:
+                    logger.debug(f"🔋 {device_name}: ✗ Rejected charge slot {slot_idx} "
+                               f"(charged {charged_kwh:.2f} kWh would exceed discharge needs "
+                               f"{discharged_kwh:.2f} kWh + {charge_buffer_percent}% buffer = {max_charge_allowed:.2f} kWh{price_str(slot_idx)})")
                 continue
         
-        selected_charge = candidate
-        price_str = f", price={slot_price:.4f}" if slot_price is not None else ""
-        energy_balance = charged_kwh - discharged_kwh
-        logger.debug(f"🔋 {device_name}: ✓ Added charge slot {slot_idx}, "
-                    f"charged={charged_kwh:.2f} kWh, discharged={discharged_kwh:.2f} kWh, "
-                    f"balance={energy_balance:+.2f} kWh, final_soc={final_soc:.1f}%{price_str}")
+        selected_charge[slot_idx] = True
+        mark_stale(slot_idx, SLOT_CHARGE)
+        accepted_sim = (final_soc, charged_kwh, discharged_kwh)
+        if debug_enabled:
+            energy_balance = charged_kwh - discharged_kwh
+            logger.debug(f"🔋 {device_name}: ✓ Added charge slot {slot_idx}, "
+                        f"charged={charged_kwh:.2f} kWh, discharged={discharged_kwh:.2f} kWh, "
+                        f"balance={energy_balance:+.2f} kWh, final_soc={final_soc:.1f}%{price_str(slot_idx)}")
         
         # Re-check if we can add more discharge slots now that we have more charge
         for d_slot in discharge_by_price:
-            if d_slot not in selected_discharge:
-                d_candidate = selected_discharge | {d_slot}
-                d_final_soc, d_feasible, d_charged_kwh, d_discharged_kwh = simulate_soc(selected_charge, d_candidate)
+            if d_slot in stale_discharge:
+                stale_discharge.discard(d_slot)
+                d_pos = insert_slot(d_slot, SLOT_DISCHARGE)
+                d_final_soc, d_feasible, d_charged_kwh, d_discharged_kwh, d_blocked = simulate_soc()
                 if d_feasible:
-                    selected_discharge = d_candidate
-                    d_slot_price = prices[d_slot] if prices and d_slot < len(prices) else None
-                    price_str = f", price={d_slot_price:.4f}" if d_slot_price is not None else ""
-                    logger.debug(f"🔋 {device_name}: ✓ Re-added discharge slot {d_slot} (now feasible with more charge, final_soc={d_final_soc:.1f}%{price_str})")
+                    selected_discharge[d_slot] = True
+                    del rejected_discharge[d_slot]
+                    mark_stale(d_slot, SLOT_DISCHARGE)
+                    accepted_sim = (d_final_soc, d_charged_kwh, d_discharged_kwh)
+                    if debug_enabled:
+                        logger.debug(f"🔋 {device_name}: ✓ Re-added discharge slot {d_slot} (now feasible with more charge, final_soc={d_final_soc:.1f}%{price_str(d_slot)})")
+                else:
+                    remove_slot(d_pos)
+                    rejected_discharge[d_slot] = d_blocked
     
-    # Combine past slots (unchanged) with limited future slots
-    final_charge_slots = past_charge_slots | selected_charge
-    final_discharge_slots = past_discharge_slots | selected_discharge
+    n_selected_charge = np.count_nonzero(selected_charge)
+    n_selected_discharge = np.count_nonzero(selected_discharge)
     
-    logger.debug(f"🔋 {device_name}: Selection complete - {len(selected_charge)} future charge slots, "
-                f"{len(selected_discharge)} future discharge slots added")
+    logger.debug(f"🔋 {device_name}: Selection complete - {n_selected_charge} future charge slots, "
+                f"{n_selected_discharge} future discharge slots added")
     
-    # Convert back to time strings
-    limited_charge_times = sorted([slot_idx_to_time(s) for s in final_charge_slots])
-    limited_discharge_times = sorted([slot_idx_to_time(s) for s in final_discharge_slots])
+    # Combine past slots (unchanged) with limited future slots
+    limited_charge_slots = bitmap_to_slots(past_charge_bmp | selected_charge)
+    limited_discharge_slots = bitmap_to_slots(past_discharge_bmp | selected_discharge)
     
     # Log results with price info if available
-    final_soc, _, total_charged, total_discharged = simulate_soc(selected_charge, selected_discharge)
+    final_soc, total_charged, total_discharged = accepted_sim
     energy_balance = total_charged - total_discharged
     
-    if prices and selected_charge:
-        avg_charge_price = sum(prices[s] for s in selected_charge if s < len(prices)) / len(selected_charge)
-        logger.info(f"🔋 {device_name}: Selected {len(selected_charge)} charge slots (avg price: {avg_charge_price:.4f}, total: {total_charged:.2f} kWh)")
-    if prices and selected_discharge:
-        avg_discharge_price = sum(prices[s] for s in selected_discharge if s < len(prices)) / len(selected_discharge)
-        logger.info(f"🔋 {device_name}: Selected {len(selected_discharge)} discharge slots (avg price: {avg_discharge_price:.4f}, total: {total_discharged:.2f} kWh)")
+    if n_prices and n_selected_charge:
+        idx = np.flatnonzero(selected_charge)
+        avg_charge_price = p_arr[idx[idx < n_prices]].sum() / n_selected_charge
+        logger.info(f"🔋 {device_name}: Selected {n_selected_charge} charge slots (avg price: {avg_charge_price:.4f}, total: {total_charged:.2f} kWh)")
+    if n_prices and n_selected_discharge:
+        idx = np.flatnonzero(selected_discharge)
+        avg_discharge_price = p_arr[idx[idx < n_prices]].sum() / n_selected_discharge
+        logger.info(f"🔋 {device_name}: Selected {n_selected_discharge} discharge slots (avg price: {avg_discharge_price:.4f}, total: {total_discharged:.2f} kWh)")
     
-    logger.info(f"🔋 {device_name}: Final - {len(limited_charge_times)} charge, {len(limited_discharge_times)} discharge slots")
+    logger.info(f"🔋 {device_name}: Final - {len(limited_charge_slots)} charge, {len(limited_discharge_slots)} discharge slots")
     logger.info(f"🔋 {device_name}: Energy balance: {energy_balance:+.2f} kWh, final_soc: {final_soc:.1f}% (started at {current_soc:.1f}%)")
     
-    return limited_charge_times, limited_discharge_times
+    return limited_charge_slots, limited_discharge_slots
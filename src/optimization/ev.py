@@ -5,12 +5,15 @@ It selects all timeslots where the electricity price is below a specified
 maximum threshold.
 """
 import logging
+import numpy as np
+
+from ._slot_times import slot_time_table
 
 logger = logging.getLogger(__name__)
 
 
 def optimize_ev(
-    prices: list[float], 
+    prices: np.ndarray | list[float], 
     slot_minutes: int, 
     max_price: float, 
     slot_to_time
@@ -21,7 +24,7 @@ def optimize_ev(
     the electricity price is at or below the specified maximum price.
     
     Args:
-        prices: List of prices per slot
+        prices: Prices per slot as ndarray or list
         slot_minutes: Duration of each slot in minutes
         max_price: Maximum acceptable price for charging (EUR/kWh)
         slot_to_time: Function to convert slot index to time string (HH:MM)
@@ -29,11 +32,13 @@ def optimize_ev(
     Returns:
         List of start times for EV charging as HH:MM strings
     """
-    slots = [i for i in range(len(prices)) if prices[i] <= max_price]
+    p = np.ascontiguousarray(prices, dtype=np.float64)
+    slots = np.flatnonzero(p <= max_price).tolist()
     
     if slots:
         logger.info(f"🚗 EV: selected {len(slots)} slots below {max_price:.4f} EUR/kWh")
     else:
         logger.info(f"🚗 EV: no slots below {max_price:.4f} EUR/kWh threshold")
     
-    return [slot_to_time(i, slot_minutes) for i in slots]
+    time_strs = slot_time_table(slot_to_time, slot_minutes, len(p))
+    return [time_strs[i] for i in slots]
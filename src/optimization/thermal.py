@@ -1,7 +1,11 @@
 """Thermal device optimization (Heat Pump and Hot Water).
 
-This module implements MILP (Mixed Integer Linear Programming) optimization
-for thermal devices like heat pumps and hot water heaters using PuLP/GLPK.
+This module implements the scheduling model for thermal devices like heat pumps
+and hot water heaters. It is solved exactly by a dynamic program over block
+starts (compiled with Numba when available); the equivalent MILP (Mixed Integer
+Linear Programming) formulation is solved with PuLP using CBC (bundled with
+PuLP), falling back to GLPK where no CBC binary is available, when an explicit
+solver is requested or the dynamic program finds no feasible schedule.
 
 The optimization considers:
 - Minimum run time (block_hours)
@@ -12,62 +16,106 @@ The optimization considers:
 """
 import pulp
 import logging
+import numpy as np
 from datetime import datetime
 
+from ._slot_times import slot_time_table
+from ._thermal_numba import solve_thermal_starts
+
 logger = logging.getLogger(__name__)
 
+# Time limit and relative MIP gap for the default solver: schedules only need to be
+# near-optimal, and stopping at a small gap prunes most of the branch-and-bound tree
+SOLVER_TIME_LIMIT_SECONDS = 30
+SOLVER_GAP_REL = 1e-4
 
-def optimize_thermal_device(
-    prices: list[float],
-    slot_minutes: int,
-    block_hours: float,
-    min_gap_hours: float,
-    max_gap_hours: float,
+
+def _default_solver() -> pulp.LpSolver:
+    """Return CBC if its binary is available on this platform, otherwise GLPK."""
+    cbc = pulp.PULP_CBC_CMD(msg=0, timeLimit=SOLVER_TIME_LIMIT_SECONDS, gapRel=SOLVER_GAP_REL)
+    if cbc.available():
+        return cbc
+    logger.debug("CBC not available, falling back to GLPK")
+    return pulp.GLPK(msg=0)
+
+
+def _sum_constraint(variables, sense: int, rhs: float) -> pulp.LpConstraint:
+    """Build ``sum(variables) <sense> rhs`` directly, without intermediate PuLP algebra."""
+    return pulp.LpConstraint(pulp.LpAffineExpression((v, 1) for v in variables), sense=sense, rhs=rhs)
+
+
+def _solve_dp(
+    window_costs: np.ndarray,
+    n_slots: int,
+    block_len: int,
+    min_gap_slots: int,
+    max_gap_slots: int,
     locked_slots: set[int],
-    initial_gap_slots: int,
-    horizon_start_datetime: datetime,
-    device_name: str = "device"
-) -> list[int]:
-    """
-    Optimize heat pump or hot water operation using sliding window constraints.
+    initial_gap_slots: int
+) -> list[int] | None:
+    """Solve the thermal scheduling model exactly with a dynamic program.
     
-    This function implements a rolling horizon optimization with:
-    - Minimum run time (block_hours) - device runs at least this long each time
-    - Minimum gap between runs (min_gap_hours) - prevents rapid cycling
-    - Maximum gap between runs (max_gap_hours) - ensures device runs regularly
-    - Support for locked slots (already scheduled/executed)
-    - Initial gap state from previous schedule
+    The MILP constraints (see ``_solve_milp``) only bound the distance between
+    consecutive starts, the first and last start and the locked starts, so they
+    translate directly into the compiled shortest path over start positions.
     
-    Args:
-        prices: List of prices per slot for the entire horizon
-        slot_minutes: Duration of each slot in minutes (e.g., 15 or 60)
-        block_hours: Minimum runtime in hours when device turns on
-        min_gap_hours: Minimum hours between end of one run and start of next
-        max_gap_hours: Maximum hours allowed without running (pause limit)
-        locked_slots: Set of slot indices that are locked (already scheduled/executed)
-        initial_gap_slots: Number of slots since last run at start of horizon
-        horizon_start_datetime: datetime when the horizon starts (for day boundary calc)
-        device_name: Name for logging purposes
-        
     Returns:
-        List of slot indices where the device should start running
+        List of start slot indices, or None if the model is infeasible
     """
-    n_slots = len(prices)
-    if n_slots == 0:
-        return []
+    n_starts = len(window_costs)
+    window_size = max_gap_slots + block_len
+    remaining_allowed_gap = max(0, max_gap_slots - initial_gap_slots)
     
-    block_len = int(block_hours * 60 / slot_minutes)  # slots per block
-    min_gap_slots = int(min_gap_hours * 60 / slot_minutes)
-    max_gap_slots = int(max_gap_hours * 60 / slot_minutes)
+    locked = np.zeros(n_starts, dtype=np.bool_)
+    for locked_start in locked_slots:
+        if 0 <= locked_start < n_starts:
+            locked[locked_start] = True
+    
+    # Starts closer than block_len + min_gap_slots conflict (no overlap, min gap)
+    min_sep = max(1, block_len + min_gap_slots)
+    if n_slots >= window_size:
+        # Every max-gap window must overlap a block: consecutive starts are at most
+        # max_gap_slots + 2 * block_len - 1 apart, the first start covers the first
+        # window and the last start covers the last window
+        max_sep = max_gap_slots + 2 * block_len - 1
+        first_max = window_size - 1
+        last_min = n_slots - window_size - block_len + 1
+    else:
+        max_sep = n_starts
+        first_max = n_starts
+        last_min = 0
+    needs_start = remaining_allowed_gap < n_starts
+    if needs_start:
+        first_max = min(first_max, remaining_allowed_gap)
+    allow_empty = n_slots < window_size and not needs_start and not locked.any()
     
+    feasible, starts = solve_thermal_starts(
+        np.ascontiguousarray(window_costs, dtype=np.float64), min_sep, max_sep,
+        first_max, last_min, allow_empty, locked)
+    return starts.tolist() if feasible else None
+
+
+def _solve_milp(
+    window_costs: list[float],
+    n_slots: int,
+    block_len: int,
+    min_gap_slots: int,
+    max_gap_slots: int,
+    locked_slots: set[int],
+    initial_gap_slots: int,
+    device_name: str,
+    solver: pulp.LpSolver | None
+) -> list[int]:
+    """Solve the thermal scheduling model as a MILP with PuLP.
+    
+    Returns:
+        List of start slot indices, or the locked slots if no optimal solution is found
+    """
     # Window size for "max gap" constraint: if max_gap is 6 hours, we can't have
     # 7 consecutive hours off, so window = max_gap_slots + block_len
     # (ensuring at least one block runs within any max_gap window)
     window_size = max_gap_slots + block_len
     
-    logger.info(f"🔧 Optimizing {device_name}: {n_slots} slots, block={block_len} slots, "
-                f"min_gap={min_gap_slots}, max_gap={max_gap_slots}, initial_gap={initial_gap_slots}")
-    
     # Create the optimization model
     model = pulp.LpProblem(f"{device_name}_Optimization", pulp.LpMinimize)
     
@@ -76,34 +124,21 @@ def optimize_thermal_device(
     valid_starts = range(n_slots - block_len + 1)
     x = {i: pulp.LpVariable(f"x_{i}", cat="Binary") for i in valid_starts}
     
-    # Helper: y[t] = 1 if device is RUNNING at slot t
-    # y[t] = sum of x[j] for all j where starting at j would cover slot t
-    def slots_covering(t):
-        """Return start indices where the block would cover slot t."""
-        return [j for j in range(max(0, t - block_len + 1), min(t + 1, len(valid_starts)))]
-    
     # Objective: minimize total cost
-    # Cost of starting at slot i = sum of prices for slots i to i+block_len-1
-    window_costs = {}
-    for i in valid_starts:
-        window_costs[i] = sum(prices[i:i + block_len])
-    
-    model += pulp.lpSum([window_costs[i] * x[i] for i in valid_starts])
-    
-    # Constraint 1: No overlapping blocks
-    # At any slot, at most one block can be running
-    for t in range(n_slots):
-        covering = slots_covering(t)
-        if covering:
-            model += pulp.lpSum([x[j] for j in covering if j in x]) <= 1
+    model += pulp.LpAffineExpression((x[i], window_costs[i]) for i in valid_starts)
     
-    # Constraint 2: Minimum gap between consecutive runs
-    # If a block starts at i, no block can start until i + block_len + min_gap_slots
-    for i in valid_starts:
-        forbidden_range = range(i + 1, min(i + block_len + min_gap_slots, len(valid_starts)))
-        for j in forbidden_range:
-            if j in x:
-                model += x[i] + x[j] <= 1
+    # Constraints 1+2: No overlapping blocks and minimum gap between consecutive runs
+    # If a block starts at i, no block can start until i + block_len + min_gap_slots.
+    # All starts within such a window conflict pairwise, so one clique inequality per
+    # window replaces the pairwise constraints and also implies no overlap (blocks
+    # overlap only when starts are less than block_len apart). Windows clipped at the
+    # end of the horizon are subsets of the last full window and are skipped.
+    clique_len = block_len + min_gap_slots
+    if clique_len > 1:
+        for i in range(max(1, len(valid_starts) - clique_len + 1)):
+            clique = range(i, min(i + clique_len, len(valid_starts)))
+            if len(clique) > 1:
+                model += _sum_constraint((x[j] for j in clique), pulp.LpConstraintLE, 1)
     
     # Constraint 3: Maximum gap (sliding window) - must run at least once in any window
     # For the initial part of the horizon, account for initial_gap_slots
@@ -119,7 +154,7 @@ def optimize_thermal_device(
     if remaining_allowed_gap < n_slots - block_len + 1:
         first_window_starts = range(0, min(remaining_allowed_gap + 1, len(valid_starts)))
         if first_window_starts:
-            model += pulp.lpSum([x[i] for i in first_window_starts if i in x]) >= 1
+            model += _sum_constraint((x[i] for i in first_window_starts if i in x), pulp.LpConstraintGE, 1)
             logger.debug(f"Initial gap constraint: must start within slots 0-{remaining_allowed_gap}")
     
     # Regular sliding window constraints for the rest of the horizon
@@ -128,20 +163,21 @@ def optimize_thermal_device(
         # All start positions that would cause the device to run within this window
         window_end = window_start + window_size
         # A block starting at i runs from i to i+block_len-1
-        # It's active in window [window_start, window_end) if any of those slots are covered
-        active_starts = [i for i in valid_starts if i < window_end and i + block_len > window_start]
+        # It's active in window [window_start, window_end) if any of those slots are covered,
+        # i.e. for the contiguous starts window_start-block_len+1 .. window_end-1
+        active_starts = range(max(0, window_start - block_len + 1), min(window_end, len(valid_starts)))
         if active_starts:
-            model += pulp.lpSum([x[i] for i in active_starts if i in x]) >= 1
+            model += _sum_constraint((x[i] for i in active_starts), pulp.LpConstraintGE, 1)
     
     # Constraint 4: Respect locked slots
     # If a slot is locked, the corresponding x must be 1
     for locked_start in locked_slots:
         if locked_start in x:
-            model += x[locked_start] == 1
+            model += _sum_constraint((x[locked_start],), pulp.LpConstraintEQ, 1)
             logger.debug(f"Locked slot: {locked_start}")
     
     # Solve the model
-    model.solve(pulp.GLPK(msg=0))
+    model.solve(solver if solver is not None else _default_solver())
     
     if model.status != pulp.LpStatusOptimal:
         logger.warning(f"⚠️ {device_name} optimization did not find optimal solution. Status: {pulp.LpStatus[model.status]}")
@@ -155,8 +191,79 @@ def optimize_thermal_device(
     return starts
 
 
+def optimize_thermal_device(
+    prices: np.ndarray | list[float],
+    slot_minutes: int,
+    block_hours: float,
+    min_gap_hours: float,
+    max_gap_hours: float,
+    locked_slots: set[int],
+    initial_gap_slots: int,
+    horizon_start_datetime: datetime,
+    device_name: str = "device",
+    solver: pulp.LpSolver | None = None
+) -> list[int]:
+    """
+    Optimize heat pump or hot water operation using sliding window constraints.
+    
+    This function implements a rolling horizon optimization with:
+    - Minimum run time (block_hours) - device runs at least this long each time
+    - Minimum gap between runs (min_gap_hours) - prevents rapid cycling
+    - Maximum gap between runs (max_gap_hours) - ensures device runs regularly
+    - Support for locked slots (already scheduled/executed)
+    - Initial gap state from previous schedule
+    
+    Args:
+        prices: Prices per slot for the entire horizon as ndarray or list
+        slot_minutes: Duration of each slot in minutes (e.g., 15 or 60)
+        block_hours: Minimum runtime in hours when device turns on
+        min_gap_hours: Minimum hours between end of one run and start of next
+        max_gap_hours: Maximum hours allowed without running (pause limit)
+        locked_slots: Set of slot indices that are locked (already scheduled/executed)
+        initial_gap_slots: Number of slots since last run at start of horizon
+        horizon_start_datetime: datetime when the horizon starts (for day boundary calc)
+        device_name: Name for logging purposes
+        solver: PuLP solver to solve the MILP with instead of the dynamic program.
+            The MILP fallback defaults to CBC, or GLPK when CBC is unavailable.
+        
+    Returns:
+        List of slot indices where the device should start running
+    """
+    n_slots = len(prices)
+    if n_slots == 0:
+        return []
+    
+    block_len = int(block_hours * 60 / slot_minutes)  # slots per block
+    min_gap_slots = int(min_gap_hours * 60 / slot_minutes)
+    max_gap_slots = int(max_gap_hours * 60 / slot_minutes)
+    
+    if n_slots < block_len:
+        # No block fits in the horizon, so there is nothing to schedule
+        logger.info(f"ℹ️ {device_name}: horizon of {n_slots} slots is shorter than one block ({block_len} slots)")
+        return []
+    
+    logger.info(f"🔧 Optimizing {device_name}: {n_slots} slots, block={block_len} slots, "
+                f"min_gap={min_gap_slots}, max_gap={max_gap_slots}, initial_gap={initial_gap_slots}")
+    
+    # Cost of starting at slot i = sum of prices for slots i to i+block_len-1,
+    # taken as differences of a prefix sum (one pass over prices)
+    csum = np.concatenate(([0.0], np.cumsum(np.asarray(prices, dtype=np.float64))))
+    window_costs = csum[block_len:] - csum[:max(0, len(csum) - block_len)]
+    
+    if solver is None:
+        starts = _solve_dp(window_costs, n_slots, block_len, min_gap_slots, max_gap_slots,
+                           locked_slots, initial_gap_slots)
+        if starts is not None:
+            logger.info(f"✅ {device_name} optimization complete: {len(starts)} runs scheduled at slots {starts}")
+            return starts
+        logger.debug(f"No feasible schedule from the dynamic program for {device_name}, falling back to MILP")
+    
+    return _solve_milp(window_costs.tolist(), n_slots, block_len, min_gap_slots, max_gap_slots,
+                       locked_slots, initial_gap_slots, device_name, solver)
+
+
 def optimize_wp(
-    prices: list[float],
+    prices: np.ndarray | list[float],
     slot_minutes: int,
     block_hours: float,
     min_gap_hours: float,
@@ -170,7 +277,7 @@ def optimize_wp(
     """Optimize heat pump operation using sliding window constraints.
     
     Args:
-        prices: List of prices per slot
+        prices: Prices per slot as ndarray or list
         slot_minutes: Duration of each slot in minutes
         block_hours: Minimum runtime when turned on
         min_gap_hours: Minimum gap between runs
@@ -215,11 +322,12 @@ def optimize_wp(
         horizon_start_datetime=horizon_start_datetime,
         device_name="WP"
     )
-    return [slot_to_time(i, slot_minutes) for i in starts]
+    time_strs = slot_time_table(slot_to_time, slot_minutes, len(prices))
+    return [time_strs[i] for i in starts]
 
 
 def optimize_hw(
-    prices: list[float],
+    prices: np.ndarray | list[float],
     slot_minutes: int,
     block_hours: float,
     min_gap_hours: float,
@@ -232,7 +340,7 @@ def optimize_hw(
     """Optimize hot water operation using sliding window constraints.
     
     Args:
-        prices: List of prices per slot
+        prices: Prices per slot as ndarray or list
         slot_minutes: Duration of each slot in minutes
         block_hours: Minimum runtime when turned on
         min_gap_hours: Minimum gap between runs
@@ -256,4 +364,5 @@ def optimize_hw(
         horizon_start_datetime=horizon_start_datetime,
         device_name="HW"
     )
-    return [slot_to_time(i, slot_minutes) for i in starts]
+    time_strs = slot_time_table(slot_to_time, slot_minutes, len(prices))
+    return [time_strs[i] for i in starts]
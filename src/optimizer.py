@@ -8,20 +8,26 @@ This module coordinates the optimization workflow:
 
 The heavy lifting is delegated to specialized modules:
 - ha_client: Home Assistant API calls
-- device_state_manager: Device state persistence (TinyDB)
+- device_state_manager: Device state persistence
+- state_store: Schedule and device state persistence (SQLite)
 - optimization/: Optimization algorithms
 """
+import asyncio
 import logging
-import json
+import numpy as np
 from datetime import datetime, timedelta
+from functools import cached_property
 from tinydb import TinyDB, Query
 
 from .ha_client import HomeAssistantClient
 from .device_state_manager import DeviceStateManager
+from .state_store import StateStore
+from .json_storage import FastJSONStorage
 from .devices import Devices
 from .scheduler import Scheduler
-from .optimization import optimize_wp, optimize_hw, optimize_battery, optimize_bat_discharge, optimize_ev, limit_battery_cycles
-from .utils import slot_to_time, slots_to_iso_ranges, merge_sequential_timeslots, time_to_slot
+from .optimization import optimize_wp, optimize_hw, optimize_battery_schedule, optimize_ev, limit_battery_cycles
+from .optimization._slot_times import slot_time_table, slot_index_table
+from .utils import slot_to_time, slot_indices_to_merged_iso_ranges, merge_sequential_timeslots, json_dumps
 from .config import CONFIG
 from .price_fetcher import EntsoeePriceFetcher
 from .devices_config import devices_config
@@ -56,9 +62,10 @@ class HeatpumpOptimizer:
             scheduler: Optional APScheduler instance for action scheduling
         """
         self.ha_client = HomeAssistantClient(access_token)
-        self.state_manager = DeviceStateManager()
-        self.devices = Devices(access_token)
-        self.scheduler_instance = Scheduler(scheduler, self.devices)
+        self.state_store = StateStore()
+        self.state_manager = DeviceStateManager(self.state_store)
+        self.devices = Devices(access_token, self.ha_client)
+        self.scheduler_instance = Scheduler(scheduler, self.devices, self.state_store)
         
         # Initialize ENTSO-E price fetcher
         entsoe_token = CONFIG['options'].get('entsoe_api_token', '')
@@ -71,6 +78,23 @@ class HeatpumpOptimizer:
         
         # Initialize Price History Manager for percentile calculations
         self.price_history_manager = PriceHistoryManager(entsoe_token, entsoe_country) if entsoe_token else None
+        
+        # Parsed schedule document reused by recalculate_battery_limits between ticks:
+        # (schedule_doc, horizon_start, horizon_end, price_arr). The optimizer is the
+        # only writer, so it is dropped whenever run_optimization saves a new schedule.
+        self._schedule_cache = None
+        
+        # Prediction pipeline, created on first use and kept so the Weather location
+        # lookup and other per-instance caches survive between runs
+        self._predictor = None
+        
+        # Inputs of the last battery recalculation that was written, used to skip
+        # recalculations that would produce the same schedule
+        self._last_recalc_key = None
+
+    async def close(self):
+        """Release the Home Assistant HTTP session."""
+        await self.ha_client.close()
 
     async def get_state(self, entity_id):
         """Get the state of an entity from Home Assistant.
@@ -86,34 +110,121 @@ class HeatpumpOptimizer:
         """
         return await self.ha_client.call_service(service, **service_data)
 
-    def _get_device_state(self, device):
-        """Get the last run state for a device.
+    def _get_schedule(self):
+        """Return the stored schedule with its parsed horizon and prices.
         
-        Delegates to DeviceStateManager for persistence operations.
-        """
-        return self.state_manager.get_device_state(device)
-
-    def _save_device_state(self, device, last_run_end, scheduled_starts):
-        """Save device state for the next optimization run.
+        The parsed document is cached until the next run_optimization, so the
+        15-minute recalculation does not re-read and re-parse it.
         
-        Delegates to DeviceStateManager for persistence operations.
+        Returns:
+            Tuple of (schedule_doc, horizon_start, horizon_end, price_arr), or None
+            if no valid schedule is stored
         """
-        self.state_manager.save_device_state(device, last_run_end, scheduled_starts)
+        if self._schedule_cache is None:
+            schedule_doc = self.state_store.get("schedule")
+            if not schedule_doc or not schedule_doc.get('horizon_start') or not schedule_doc.get('prices'):
+                return None
+            self._schedule_cache = (
+                schedule_doc,
+                datetime.fromisoformat(schedule_doc['horizon_start']),
+                datetime.fromisoformat(schedule_doc['horizon_end']),
+                # Stored prices are a JSON list; convert once for all battery devices and ticks
+                np.asarray(schedule_doc['prices'], dtype=np.float64),
+            )
+        return self._schedule_cache
 
-    def _calculate_initial_gap(self, device, horizon_start, slot_minutes, block_hours):
-        """Calculate how many slots since the device last ran.
-        
-        Delegates to DeviceStateManager for persistence operations.
+    @cached_property
+    def _device_block_minutes(self):
+        """Block duration in minutes of every schedule entry, keyed by device entry name.
+
+        The device list and block hours only change with the configuration, which
+        is loaded at startup, so the mapping is built once per optimizer.
         """
-        return self.state_manager.calculate_initial_gap(device, horizon_start, slot_minutes, block_hours)
+        slot_minutes = CONFIG['options'].get('slot_minutes', 15)
+        device_block_minutes = {}
+        for device in devices_config.devices:
+            if device.type == 'wp':
+                block_hours = device.block_hours if device.block_hours is not None else 1.0
+                device_block_minutes[device.name] = int(block_hours * 60)
+            elif device.type == 'hw':
+                block_hours = device.block_hours if device.block_hours is not None else 1.0
+                device_block_minutes[device.name] = int(block_hours * 60)
+            elif device.type == 'battery':
+                # Battery has separate charge and discharge entries
+                device_block_minutes[f"{device.name}_charge"] = slot_minutes  # Single slot
+                device_block_minutes[f"{device.name}_discharge"] = slot_minutes  # Single slot
+                if device.price_based_solar_grid_export:
+                    device_block_minutes[f"{device.name}_block_grid_export"] = slot_minutes  # Single slot
+            elif device.type == 'ev':
+                device_block_minutes[device.name] = slot_minutes  # Single slot
+        return device_block_minutes
 
-    def _get_locked_slots(self, device, horizon_start, lock_end_datetime, slot_minutes, block_hours):
-        """Get slot indices that are locked (already scheduled and shouldn't be changed).
-        
-        Delegates to DeviceStateManager for persistence operations.
-        Note: block_hours is kept for API compatibility but not used in this delegation.
+    def _thermal_state_doc(self, device_name, times, slot_of_time, block_slots, slot_minutes, slot_datetimes, updated_at):
+        """Build the state document with the last run end and scheduled starts of a WP/HW device.
+
+        Args:
+            device_name: Device name
+            times: Scheduled start times (HH:MM relative to the horizon start)
+            slot_of_time: Slot index of every start time string of the horizon
+            block_slots: Slots per run block
+            slot_minutes: Duration of each slot in minutes
+            slot_datetimes: Start datetime of every slot, covering the longest block past the horizon
+            updated_at: Timestamp of the optimization run
+
+        Returns:
+            State document for DeviceStateManager.save_device_states, or None without starts
+        """
+        if not times:
+            return None
+        slot_indices = [slot_of_time[t] for t in times]
+        last_end = slot_datetimes[max(slot_indices) + block_slots]
+        return self.state_manager.build_state_doc(
+            device_name, last_end, slot_datetimes[0], slot_minutes, slot_indices, updated_at
+        )
+
+    async def _get_wp_expected_runtime(self, wp_device, runtime_calc):
+        """Check the temperature disable threshold and calculate the expected daily runtime of a WP device.
+
+        Returns:
+            Tuple of (optimization enabled, expected daily runtime or None)
         """
-        return self.state_manager.get_locked_slots(device, horizon_start, lock_end_datetime, slot_minutes)
+        device_name = wp_device.name
+        # ── Temperature-based optimization disable check ──────────────────────
+        if (wp_device.disable_optimization_above_avg_temp is not None
+                and wp_device.outside_temp_sensor):
+            avg_temp = await self.ha_client.get_avg_temperature_48h(wp_device.outside_temp_sensor)
+            if avg_temp is not None and avg_temp > wp_device.disable_optimization_above_avg_temp:
+                logger.info(
+                    f"🌡️ {device_name}: Skipping optimization — 48h average outside temperature "
+                    f"({avg_temp:.1f}°C) exceeds threshold ({wp_device.disable_optimization_above_avg_temp}°C)"
+                )
+                return False, None
+            elif avg_temp is not None:
+                logger.info(
+                    f"🌡️ {device_name}: 48h average outside temperature {avg_temp:.1f}°C "
+                    f"— below threshold ({wp_device.disable_optimization_above_avg_temp}°C), optimization enabled"
+                )
+        # ─────────────────────────────────────────────────────────────────────
+
+        # Calculate expected daily runtime from historical data
+        expected_daily_runtime = None
+        if (wp_device.inside_temp_sensor and 
+            wp_device.outside_temp_sensor and 
+            wp_device.heatpump_status_sensor):
+
+            # Use RuntimeCalculator to load history, calculate, and store runtime
+            expected_daily_runtime = await runtime_calc.calculate_and_store_daily_runtime(
+                ha_url=self.ha_client.ha_url,
+                access_token=self.ha_client.get_access_token(),
+                device_name=device_name,
+                inside_temp_sensor=wp_device.inside_temp_sensor,
+                outside_temp_sensor=wp_device.outside_temp_sensor,
+                heatpump_status_sensor=wp_device.heatpump_status_sensor,
+                days_back=10
+            )
+        else:
+            logger.debug(f"ℹ️ {device_name}: Runtime sensors not configured, skipping runtime calculation")
+        return True, expected_daily_runtime
 
     async def run_optimization(self):
         """Main optimization logic using rolling horizon."""
@@ -129,6 +240,9 @@ class HeatpumpOptimizer:
 
         EV_MAX_PRICE = 0.02  # 11 cents per kWh
 
+        # Timestamp of this run, shared by the schedule and the device states it saves
+        run_started = datetime.now()
+
         logger.info("🔎 Starting energy optimization using ENTSO-E prices (rolling horizon)...")
         logger.info(f"🔋 Battery optimization settings: "
                    f"history_days={BAT_PRICE_HISTORY_DAYS}, "
@@ -140,14 +254,18 @@ class HeatpumpOptimizer:
             logger.error("⚠️ ENTSO-E price fetcher not configured. Please set entsoe_api_token in config.json")
             return
 
-        # Fetch horizon prices (from now until end of tomorrow)
-        horizon_data = self.price_fetcher.get_horizon_prices(lock_hours=LOCK_HOURS)
+        # Fetch horizon prices (from now until end of tomorrow). The ENTSO-E client and its
+        # retry waits block, so run them in a worker thread to keep the event loop responsive
+        horizon_data = await asyncio.to_thread(self.price_fetcher.get_horizon_prices, lock_hours=LOCK_HOURS)
         
         if not horizon_data:
             logger.error("⚠️ Failed to fetch price data from ENTSO-E")
             return
 
         prices = horizon_data['prices']
+        # Convert prices once and share the array across all device optimizers;
+        # the plain list is kept for JSON serialization of the schedule
+        price_arr = np.asarray(prices, dtype=np.float64)
         horizon_start = horizon_data['horizon_start']
         horizon_end = horizon_data['horizon_end']
         lock_end_slot = horizon_data['lock_end_slot']
@@ -155,6 +273,8 @@ class HeatpumpOptimizer:
         full_day_min_price = horizon_data.get('full_day_min_price')
         # Use SLOT_MINUTES from config (should match price_fetcher's slot_minutes)
         slot_minutes = SLOT_MINUTES
+        # The optimizers return slot start times as strings; map them back by lookup
+        slot_of_time = slot_index_table(slot_to_time, slot_minutes, len(prices))
         
         lock_end_datetime = horizon_start + timedelta(hours=LOCK_HOURS)
         
@@ -186,59 +306,53 @@ class HeatpumpOptimizer:
 
         results = {}
         
-        # ===== HEAT PUMP OPTIMIZATION (iterate over all WP devices) =====
         wp_devices = devices_config.get_devices_by_type('wp')
+        hw_devices = devices_config.get_devices_by_type('hw')
+        battery_devices = devices_config.get_devices_by_type('battery')
+        ev_devices = devices_config.get_devices_by_type('ev')
+        # Initial gap and locked slots of all thermal devices in one state read
+        thermal_context = self.state_manager.get_device_context(
+            [device.name for device in wp_devices + hw_devices],
+            horizon_start, lock_end_datetime, slot_minutes
+        )
+        
+        # Start datetime of every slot, extended by the longest thermal block so run ends
+        # can be looked up as well
+        slot_delta = timedelta(minutes=slot_minutes)
+        max_block_slots = max(
+            (int((device.block_hours if device.block_hours is not None else 1.0) * 60 / slot_minutes)
+             for device in wp_devices + hw_devices),
+            default=0
+        )
+        slot_datetimes = [horizon_start + i * slot_delta for i in range(len(prices) + max_block_slots + 1)]
+        
+        # ===== HEAT PUMP OPTIMIZATION (iterate over all WP devices) =====
         runtime_calc = RuntimeCalculator()
         
-        for wp_device in wp_devices:
+        # Home Assistant history lookups of all WP devices run concurrently;
+        # the schedule optimizations themselves are fast and run in order below
+        wp_runtimes = await asyncio.gather(
+            *(self._get_wp_expected_runtime(wp_device, runtime_calc) for wp_device in wp_devices)
+        )
+        
+        # State documents of the WP/HW devices, saved together after both loops
+        thermal_states = []
+        
+        for wp_device, (wp_enabled, expected_daily_runtime) in zip(wp_devices, wp_runtimes):
             device_name = wp_device.name
             # Use device-specific config with fallback defaults
             WP_BLOCK_HOURS = wp_device.block_hours if wp_device.block_hours is not None else 1.0
             WP_MIN_GAP_HOURS = wp_device.min_gap_hours if wp_device.min_gap_hours is not None else 3.0
             WP_MAX_GAP_HOURS = wp_device.max_gap_hours if wp_device.max_gap_hours is not None else 8.0
 
-            # ── Temperature-based optimization disable check ──────────────────────
-            if (wp_device.disable_optimization_above_avg_temp is not None
-                    and wp_device.outside_temp_sensor):
-                avg_temp = await self.ha_client.get_avg_temperature_48h(wp_device.outside_temp_sensor)
-                if avg_temp is not None and avg_temp > wp_device.disable_optimization_above_avg_temp:
-                    logger.info(
-                        f"🌡️ {device_name}: Skipping optimization — 48h average outside temperature "
-                        f"({avg_temp:.1f}°C) exceeds threshold ({wp_device.disable_optimization_above_avg_temp}°C)"
-                    )
-                    results[device_name] = []
-                    continue
-                elif avg_temp is not None:
-                    logger.info(
-                        f"🌡️ {device_name}: 48h average outside temperature {avg_temp:.1f}°C "
-                        f"— below threshold ({wp_device.disable_optimization_above_avg_temp}°C), optimization enabled"
-                    )
-            # ─────────────────────────────────────────────────────────────────────
-            
-            # Calculate expected daily runtime from historical data
-            expected_daily_runtime = None
-            if (wp_device.inside_temp_sensor and 
-                wp_device.outside_temp_sensor and 
-                wp_device.heatpump_status_sensor):
-                
-                # Use RuntimeCalculator to load history, calculate, and store runtime
-                expected_daily_runtime = await runtime_calc.calculate_and_store_daily_runtime(
-                    ha_url=self.ha_client.ha_url,
-                    access_token=self.ha_client.get_access_token(),
-                    device_name=device_name,
-                    inside_temp_sensor=wp_device.inside_temp_sensor,
-                    outside_temp_sensor=wp_device.outside_temp_sensor,
-                    heatpump_status_sensor=wp_device.heatpump_status_sensor,
-                    days_back=10
-                )
-            else:
-                logger.debug(f"ℹ️ {device_name}: Runtime sensors not configured, skipping runtime calculation")
+            if not wp_enabled:
+                results[device_name] = []
+                continue
             
-            wp_initial_gap = self._calculate_initial_gap(device_name, horizon_start, slot_minutes, WP_BLOCK_HOURS)
-            wp_locked_slots = self._get_locked_slots(device_name, horizon_start, lock_end_datetime, slot_minutes, WP_BLOCK_HOURS)
+            wp_initial_gap, wp_locked_slots = thermal_context[device_name]
             
             wp_times = optimize_wp(
-                prices=prices,
+                prices=price_arr,
                 slot_minutes=slot_minutes,
                 block_hours=WP_BLOCK_HOURS,
                 min_gap_hours=WP_MIN_GAP_HOURS,
@@ -251,17 +365,16 @@ class HeatpumpOptimizer:
             )
             results[device_name] = wp_times
             
-            # Calculate last run end and save state for this WP device
-            if wp_times:
-                wp_slot_indices = [time_to_slot(t, slot_minutes) for t in wp_times]
-                last_wp_slot = max(wp_slot_indices)
-                last_wp_end = horizon_start + timedelta(minutes=(last_wp_slot + int(WP_BLOCK_HOURS * 60 / slot_minutes)) * slot_minutes)
-                wp_scheduled_starts = [horizon_start + timedelta(minutes=idx * slot_minutes) for idx in wp_slot_indices]
-                self._save_device_state(device_name, last_wp_end, wp_scheduled_starts)
+            # Calculate last run end and state for this WP device
+            state_doc = self._thermal_state_doc(
+                device_name, wp_times, slot_of_time, int(WP_BLOCK_HOURS * 60 / slot_minutes), slot_minutes, slot_datetimes,
+                run_started
+            )
+            if state_doc:
+                thermal_states.append(state_doc)
 
 
         # ===== HOT WATER OPTIMIZATION (iterate over all HW devices) =====
-        hw_devices = devices_config.get_devices_by_type('hw')
         for hw_device in hw_devices:
             device_name = hw_device.name
             # Use device-specific config with fallback defaults
@@ -269,11 +382,10 @@ class HeatpumpOptimizer:
             HW_MIN_GAP_HOURS = hw_device.min_gap_hours if hw_device.min_gap_hours is not None else 6.0
             HW_MAX_GAP_HOURS = hw_device.max_gap_hours if hw_device.max_gap_hours is not None else 12.0
             
-            hw_initial_gap = self._calculate_initial_gap(device_name, horizon_start, slot_minutes, HW_BLOCK_HOURS)
-            hw_locked_slots = self._get_locked_slots(device_name, horizon_start, lock_end_datetime, slot_minutes, HW_BLOCK_HOURS)
+            hw_initial_gap, hw_locked_slots = thermal_context[device_name]
             
             hw_times = optimize_hw(
-                prices=prices,
+                prices=price_arr,
                 slot_minutes=slot_minutes,
                 block_hours=HW_BLOCK_HOURS,
                 min_gap_hours=HW_MIN_GAP_HOURS,
@@ -285,40 +397,32 @@ class HeatpumpOptimizer:
             )
             results[device_name] = hw_times
             
-            # Calculate last run end and save state for this HW device
-            if hw_times:
-                hw_slot_indices = [time_to_slot(t, slot_minutes) for t in hw_times]
-                last_hw_slot = max(hw_slot_indices)
-                last_hw_end = horizon_start + timedelta(minutes=(last_hw_slot + int(HW_BLOCK_HOURS * 60 / slot_minutes)) * slot_minutes)
-                hw_scheduled_starts = [horizon_start + timedelta(minutes=idx * slot_minutes) for idx in hw_slot_indices]
-                self._save_device_state(device_name, last_hw_end, hw_scheduled_starts)
+            # Calculate last run end and state for this HW device
+            state_doc = self._thermal_state_doc(
+                device_name, hw_times, slot_of_time, int(HW_BLOCK_HOURS * 60 / slot_minutes), slot_minutes, slot_datetimes,
+                run_started
+            )
+            if state_doc:
+                thermal_states.append(state_doc)
+
+        # Save the state of all WP/HW devices in one write
+        self.state_manager.save_device_states(thermal_states)
 
         # ===== BATTERY OPTIMIZATION (iterate over all battery devices) =====
         # Battery devices have both charge and discharge schedules
         # We store ORIGINAL times from price optimization (for display) and LIMITED times (for scheduling)
         original_battery_times = {}  # Store original times before SOC limiting
         discharge_price_context = {}  # Store price context for preserving discharge decisions
-        
-        battery_devices = devices_config.get_devices_by_type('battery')
         for bat_device in battery_devices:
             device_name = bat_device.name
             
-            # Optimize battery charging based on price thresholds
-            bat_charge_times = optimize_battery(
-                prices=prices,
-                slot_minutes=slot_minutes,
-                slot_to_time=slot_to_time,
-                max_charge_price=max_charge_price,
-                price_difference_threshold=BAT_PRICE_DIFF_THRESHOLD
-            )
-            
-            # Optimize battery discharging based on price thresholds
-            # Note: optimize_bat_discharge returns a tuple (times, price_context)
+            # Optimize battery charging and discharging based on price thresholds in one pass
             # Pass full_day_min_price to preserve discharge decisions even when low prices have passed
-            bat_discharge_times, bat_price_context = optimize_bat_discharge(
-                prices=prices,
+            bat_charge_times, bat_discharge_times, bat_price_context = optimize_battery_schedule(
+                prices=price_arr,
                 slot_minutes=slot_minutes,
                 slot_to_time=slot_to_time,
+                max_charge_price=max_charge_price,
                 min_discharge_price=min_discharge_price,
                 price_difference_threshold=BAT_PRICE_DIFF_THRESHOLD,
                 reference_min_price=full_day_min_price
@@ -337,98 +441,75 @@ class HeatpumpOptimizer:
 
             # Compute export-blocking slots for negative-price periods
             if bat_device.price_based_solar_grid_export:
-                block_grid_export_times = [
-                    slot_to_time(i, slot_minutes)
-                    for i, price in enumerate(prices)
-                    if price < 0
-                ]
+                slot_times = slot_time_table(slot_to_time, slot_minutes, len(price_arr))
+                block_grid_export_times = [slot_times[i] for i in np.flatnonzero(price_arr < 0).tolist()]
                 results[f"{device_name}_block_grid_export"] = block_grid_export_times
                 logger.info(f"☀️ {device_name}: {len(block_grid_export_times)} slot(s) with negative prices → grid export will be blocked")
 
         # ===== EV OPTIMIZATION (iterate over all EV devices) =====
-        ev_devices = devices_config.get_devices_by_type('ev')
         for ev_device in ev_devices:
             device_name = ev_device.name
-            ev_times = optimize_ev(prices, slot_minutes, EV_MAX_PRICE, slot_to_time)
+            ev_times = optimize_ev(price_arr, slot_minutes, EV_MAX_PRICE, slot_to_time)
             results[device_name] = ev_times
 
-        logger.info(f"⚙️ Optimization Results (before SOC limiting): {json.dumps(results)}")
+        logger.info(f"⚙️ Optimization Results (before SOC limiting): {json_dumps(results)}")
 
-        # Convert results to ISO time ranges for scheduling
-        # Build device_block_minutes dynamically based on device type
-        device_block_minutes = {}
-        for device in devices_config.devices:
-            if device.type == 'wp':
-                block_hours = device.block_hours if device.block_hours is not None else 1.0
-                device_block_minutes[device.name] = int(block_hours * 60)
-            elif device.type == 'hw':
-                block_hours = device.block_hours if device.block_hours is not None else 1.0
-                device_block_minutes[device.name] = int(block_hours * 60)
-            elif device.type == 'battery':
-                # Battery has separate charge and discharge entries
-                device_block_minutes[f"{device.name}_charge"] = slot_minutes  # Single slot
-                device_block_minutes[f"{device.name}_discharge"] = slot_minutes  # Single slot
-                if device.price_based_solar_grid_export:
-                    device_block_minutes[f"{device.name}_block_grid_export"] = slot_minutes  # Single slot
-            elif device.type == 'ev':
-                device_block_minutes[device.name] = slot_minutes  # Single slot
+        # Convert results to merged ISO time ranges for scheduling; every device
+        # appears once, so its blocks are merged in the same pass
+        device_block_minutes = self._device_block_minutes
         
-        iso_times = []
-        
-        # Process all devices in results
+        iso_times_merged = []
         for device_name, times in results.items():
             if times:
-                iso_times.append(slots_to_iso_ranges(
-                    times, device_name, horizon_start.date(), horizon_start,
-                    block_minutes=device_block_minutes.get(device_name, slot_minutes)
+                iso_times_merged.extend(slot_indices_to_merged_iso_ranges(
+                    [slot_of_time[t] for t in times], device_name, horizon_start,
+                    slot_minutes, device_block_minutes.get(device_name, slot_minutes)
                 ))
-
-        iso_times_merged = merge_sequential_timeslots(iso_times)
         
         # Also convert original battery times to ISO ranges for display on Gantt chart
-        original_iso_times = []
+        original_battery_iso_times_merged = []
         for device_key, times in original_battery_times.items():
             if times:
-                original_iso_times.append(slots_to_iso_ranges(
-                    times, device_key, horizon_start.date(), horizon_start,
-                    block_minutes=slot_minutes
+                original_battery_iso_times_merged.extend(slot_indices_to_merged_iso_ranges(
+                    [slot_of_time[t] for t in times], device_key, horizon_start,
+                    slot_minutes, slot_minutes
                 ))
-        original_battery_iso_times_merged = merge_sequential_timeslots(original_iso_times)
-
-        # Save schedule to TinyDB (without limited times yet - will be added by recalculate)
-        with TinyDB('db.json') as db:
-            db.upsert({
-                "id": "schedule",
-                "schedule": iso_times_merged,  # Will be updated with limited times
-                "original_battery_schedule": original_battery_iso_times_merged,  # Original price-based times for display
-                "horizon_start": horizon_start.isoformat(),
-                "horizon_end": horizon_end.isoformat(),
-                "prices": prices,  # Store prices for recalculation
-                "slot_minutes": slot_minutes,
-                "updated_at": datetime.now().isoformat(),
-                "battery_price_thresholds": {
-                    "max_charge_price": max_charge_price,
-                    "min_discharge_price": min_discharge_price,
-                    "price_history_days": BAT_PRICE_HISTORY_DAYS,
-                    "charge_percentile": BAT_CHARGE_PERCENTILE,
-                    "discharge_percentile": BAT_DISCHARGE_PERCENTILE,
-                    "price_diff_threshold": BAT_PRICE_DIFF_THRESHOLD
-                },
-                "discharge_price_context": discharge_price_context  # Preserve min price for discharge threshold calculations
-            }, Query().id == "schedule")
-        
-        logger.info(f"✅ Optimization complete. Schedule saved to TinyDB.")
+
+        # Save schedule (without limited times yet - will be added by recalculate)
+        self.state_store.upsert({
+            "id": "schedule",
+            "schedule": iso_times_merged,  # Will be updated with limited times
+            "original_battery_schedule": original_battery_iso_times_merged,  # Original price-based times for display
+            "horizon_start": horizon_start.isoformat(),
+            "horizon_end": horizon_end.isoformat(),
+            "prices": prices,  # Store prices for recalculation
+            "slot_minutes": slot_minutes,
+            "updated_at": run_started.isoformat(),
+            "battery_price_thresholds": {
+                "max_charge_price": max_charge_price,
+                "min_discharge_price": min_discharge_price,
+                "price_history_days": BAT_PRICE_HISTORY_DAYS,
+                "charge_percentile": BAT_CHARGE_PERCENTILE,
+                "discharge_percentile": BAT_DISCHARGE_PERCENTILE,
+                "price_diff_threshold": BAT_PRICE_DIFF_THRESHOLD
+            },
+            "discharge_price_context": discharge_price_context  # Preserve min price for discharge threshold calculations
+        })
+        self._schedule_cache = None
+        
+        logger.info(f"✅ Optimization complete. Schedule saved.")
         
         # Calculate and cache production & consumption predictions (full ML run)
         await self._calculate_and_cache_predictions()
         
         # Run initial battery cycle limiting based on current SOC
-        await self.recalculate_battery_limits()
+        # Actions are scheduled once below, after the battery limits are applied
+        await self.recalculate_battery_limits(schedule_actions=False)
         
         # Schedule actions from database
         await self.scheduler_instance.schedule_actions()
 
-    async def recalculate_battery_limits(self):
+    async def recalculate_battery_limits(self, schedule_actions=True):
         """Recalculate battery cycle limits based on current SOC.
         
         Called after optimization and every 15 minutes to adapt to actual SOC changes.
@@ -436,28 +517,28 @@ class HeatpumpOptimizer:
         Solar-only mode is evaluated globally: when total predicted solar production
         exceeds total predicted power usage, battery charging and discharging are
         disabled entirely and a solar_only schedule entry is added instead.
+
+        Args:
+            schedule_actions: Reschedule actions after saving the schedule. run_optimization
+                passes False because it schedules the actions itself afterwards.
         """
         logger.info("🔋 Recalculating battery cycle limits based on current SOC...")
         
-        # Load schedule from database
-        with TinyDB('db.json') as db:
-            schedule_doc = db.get(Query().id == "schedule")
-        
-        # Validate schedule exists and has required data
-        if not schedule_doc or not schedule_doc.get('horizon_start') or not schedule_doc.get('prices'):
+        # Load schedule (cached between ticks) and validate it has the required data
+        schedule = self._get_schedule()
+        if schedule is None:
             logger.warning("⚠️ No valid schedule found, skipping recalculation")
             return
+        schedule_doc, horizon_start, horizon_end, price_arr = schedule
         
-        # Parse schedule parameters
-        horizon_start = datetime.fromisoformat(schedule_doc['horizon_start'])
-        horizon_end = datetime.fromisoformat(schedule_doc['horizon_end'])
+        # One timestamp for the horizon check, the current slot and the saved documents
+        now = datetime.now()
         
         # Skip if optimization horizon has expired
-        if datetime.now() >= horizon_end:
+        if now >= horizon_end:
             logger.info("📅 Horizon expired, skipping recalculation")
             return
         
-        prices = schedule_doc['prices']
         slot_minutes = schedule_doc.get('slot_minutes', 15)
         original_battery_schedule = schedule_doc.get('original_battery_schedule', [])
 
@@ -488,24 +569,70 @@ class HeatpumpOptimizer:
         else:
             logger.info("☀️ Insufficient solar/usage predictions – proceeding with normal battery optimization")
         
-        # Keep all non-battery entries from current schedule
+        battery_devices = devices_config.get_devices_by_type('battery')
+
+        # Keep all non-battery entries from current schedule. Entries of batteries that
+        # were removed or renamed are recognized by their suffix, unless a configured
+        # non-battery device happens to have such a name.
+        battery_suffixes = ('_charge', '_discharge', '_solar_only')
+        battery_keys = {
+            f"{bat_device.name}{suffix}"
+            for bat_device in battery_devices
+            for suffix in battery_suffixes
+        }
+        other_device_names = {device.name for device in devices_config.devices if device.type != 'battery'}
         new_schedule = [
             entry for entry in schedule_doc.get('schedule', [])
-            if not (entry.get('device', '').endswith('_charge') or 
-                   entry.get('device', '').endswith('_discharge') or
-                   entry.get('device', '').endswith('_solar_only'))
+            if entry.get('device') not in battery_keys
+            and (entry.get('device') in other_device_names
+                 or not entry.get('device', '').endswith(battery_suffixes))
         ]
 
-        # Accumulate SOC predictions for all battery devices
-        battery_soc_predictions: dict[str, list[dict]] = {}
-        
-        # Process each battery device
-        for bat_device in devices_config.get_devices_by_type('battery'):
+        # Gather the cycle limiter inputs of every battery device (normal mode only)
+        battery_inputs = []
+        if not solar_only_mode:
+            current_schedule = schedule_doc.get('schedule', [])
+            # Get current SOC of all batteries concurrently (or use 50% as fallback)
+            battery_socs = await asyncio.gather(
+                *(self._get_battery_soc(bat_device) for bat_device in battery_devices)
+            )
+            for bat_device, current_soc in zip(battery_devices, battery_socs):
+                # Extract original times from stored schedule (already filtered for future slots)
+                original_charge = self._extract_slots(original_battery_schedule, f"{bat_device.name}_charge_planned", horizon_start, slot_minutes)
+                original_discharge = self._extract_slots(original_battery_schedule, f"{bat_device.name}_discharge_planned", horizon_start, slot_minutes)
+
+                # Extract previously limited times from current schedule to preserve past planned slots
+                prev_limited_charge = self._extract_slots(current_schedule, f"{bat_device.name}_charge", horizon_start, slot_minutes)
+                prev_limited_discharge = self._extract_slots(current_schedule, f"{bat_device.name}_discharge", horizon_start, slot_minutes)
+
+                battery_inputs.append((
+                    bat_device, current_soc, original_charge, original_discharge,
+                    prev_limited_charge, prev_limited_discharge
+                ))
+
+        # The limited schedule only depends on the stored schedule, the current slot, the
+        # predictions and the SOC, so an unchanged key means the stored schedule is still
+        # up to date. The current slot is part of the key because the limiter drops the
+        # slots that have passed and re-plans from there. The SOC is compared at 1%
+        # resolution; the previously limited output is left out of the key because it is
+        # this method's own result.
+        recalc_key = (
+            schedule_doc.get('updated_at'),
+            (now - horizon_start) // timedelta(minutes=slot_minutes),
+            solar_only_mode,
+            tuple(p['predicted_kwh'] for p in predicted_usage or ()),
+            tuple(p['predicted_kwh'] for p in predicted_solar or ()),
+            tuple((bat_device.name, round(current_soc)) for bat_device, current_soc, *_ in battery_inputs),
+        )
+        if recalc_key == self._last_recalc_key:
+            logger.info("🔋 Slot, SOC, predictions and schedule unchanged, skipping recalculation")
+            return
 
-            if solar_only_mode:
-                # Solar-only mode: skip charge/discharge entirely and add a solar_only entry
-                # spanning the full optimization horizon so the inverter can be configured
-                # to allow passive solar charging.
+        if solar_only_mode:
+            # Solar-only mode: skip charge/discharge entirely and add a solar_only entry
+            # spanning the full optimization horizon so the inverter can be configured
+            # to allow passive solar charging.
+            for bat_device in battery_devices:
                 new_schedule.append({
                     "device": f"{bat_device.name}_solar_only",
                     "start": horizon_start.isoformat(),
@@ -515,20 +642,13 @@ class HeatpumpOptimizer:
                     f"☀️ {bat_device.name}: Added solar_only entry "
                     f"({horizon_start} → {horizon_end})"
                 )
-                continue
 
-            # Normal mode: apply SOC-based cycle limiting
-            # Get current SOC (or use 50% as fallback)
-            current_soc = await self._get_battery_soc(bat_device)
-            
-            # Extract original times from stored schedule (already filtered for future slots)
-            original_charge = self._extract_times(original_battery_schedule, f"{bat_device.name}_charge_planned", horizon_start, slot_minutes)
-            original_discharge = self._extract_times(original_battery_schedule, f"{bat_device.name}_discharge_planned", horizon_start, slot_minutes)
-
-            # Extract previously limited times from current schedule to preserve past planned slots
-            current_schedule = schedule_doc.get('schedule', [])
-            prev_limited_charge = self._extract_times(current_schedule, f"{bat_device.name}_charge", horizon_start, slot_minutes)
-            prev_limited_discharge = self._extract_times(current_schedule, f"{bat_device.name}_discharge", horizon_start, slot_minutes)
+        # Accumulate SOC predictions for all battery devices
+        battery_soc_predictions: dict[str, list[dict]] = {}
+        
+        # Normal mode: apply SOC-based cycle limiting to each battery device
+        for (bat_device, current_soc, original_charge, original_discharge,
+                prev_limited_charge, prev_limited_discharge) in battery_inputs:
 
             if original_charge or original_discharge:
                 logger.debug(f"🕐 {bat_device.name}: Processing {len(original_charge)} charge and {len(original_discharge)} discharge future slots")
@@ -536,8 +656,8 @@ class HeatpumpOptimizer:
             # Apply SOC-based cycle limiting if battery config is complete
             if bat_device.battery_capacity_kwh and bat_device.battery_charge_speed_kw:
                 limited_charge, limited_discharge = limit_battery_cycles(
-                    charge_times=original_charge,
-                    discharge_times=original_discharge,
+                    charge_slots=original_charge,
+                    discharge_slots=original_discharge,
                     slot_minutes=slot_minutes,
                     horizon_start=horizon_start,
                     current_soc=current_soc,
@@ -545,12 +665,12 @@ class HeatpumpOptimizer:
                     battery_charge_speed_kw=bat_device.battery_charge_speed_kw,
                     min_soc_percent=bat_device.battery_min_soc_percent or 20.0,
                     max_soc_percent=bat_device.battery_max_soc_percent or 80.0,
-                    prices=prices,
+                    prices=price_arr,
                     predicted_power_usage=predicted_usage,
                     predicted_solar=predicted_solar,
                     device_name=bat_device.name,
-                    previous_limited_charge_times=prev_limited_charge,
-                    previous_limited_discharge_times=prev_limited_discharge,
+                    previous_limited_charge_slots=prev_limited_charge,
+                    previous_limited_discharge_slots=prev_limited_discharge,
                 )
             else:
                 # Use original times if battery not fully configured
@@ -558,15 +678,15 @@ class HeatpumpOptimizer:
                 limited_charge, limited_discharge = original_charge, original_discharge
             
             # Add limited times to schedule
-            new_schedule.extend(self._times_to_schedule(limited_charge, f"{bat_device.name}_charge", horizon_start, slot_minutes))
-            new_schedule.extend(self._times_to_schedule(limited_discharge, f"{bat_device.name}_discharge", horizon_start, slot_minutes))
+            new_schedule.extend(self._slots_to_schedule(limited_charge, f"{bat_device.name}_charge", horizon_start, slot_minutes))
+            new_schedule.extend(self._slots_to_schedule(limited_discharge, f"{bat_device.name}_discharge", horizon_start, slot_minutes))
         
             # Compute battery SOC prediction for this device
             if bat_device.battery_capacity_kwh and bat_device.battery_charge_speed_kw:
                 try:
                     soc_prediction = predict_battery_soc(
-                        charge_times=limited_charge,
-                        discharge_times=limited_discharge,
+                        charge_slots=limited_charge,
+                        discharge_slots=limited_discharge,
                         slot_minutes=slot_minutes,
                         horizon_start=horizon_start,
                         horizon_end=horizon_end,
@@ -586,27 +706,30 @@ class HeatpumpOptimizer:
         # Merge and save updated schedule
         new_schedule = merge_sequential_timeslots([new_schedule])
         schedule_doc['schedule'] = new_schedule
-        schedule_doc['last_soc_recalc'] = datetime.now().isoformat()
+        schedule_doc['last_soc_recalc'] = now.isoformat()
         schedule_doc['solar_only_mode'] = solar_only_mode
         
-        with TinyDB('db.json') as db:
-            db.upsert(schedule_doc, Query().id == "schedule")
+        # The schedule document was loaded above, so replace it in place
+        if not self.state_store.update(schedule_doc):
+            self.state_store.upsert(schedule_doc)
+        self._last_recalc_key = recalc_key
 
         # Save battery SOC predictions alongside usage/solar predictions
         if battery_soc_predictions:
-            with TinyDB('db.json') as db:
+            with TinyDB('db.json', storage=FastJSONStorage) as db:
                 existing = db.get(Query().id == 'predictions') or {}
                 existing.update({
                     'id': 'predictions',
                     'battery_soc': battery_soc_predictions,
-                    'updated_at': datetime.now().isoformat()
+                    'updated_at': now.isoformat()
                 })
                 db.upsert(existing, Query().id == 'predictions')
             total_points = sum(len(v) for v in battery_soc_predictions.values())
             logger.info(f"🔋 Saved battery SOC predictions for {len(battery_soc_predictions)} device(s) ({total_points} data points)")
         
         logger.info(f"✅ Battery limits recalculated ({len(new_schedule)} entries)")
-        await self.scheduler_instance.schedule_actions()
+        if schedule_actions:
+            await self.scheduler_instance.schedule_actions()
 
     async def _get_battery_soc(self, bat_device):
         """Get current battery SOC, return 50% as fallback."""
@@ -623,37 +746,48 @@ class HeatpumpOptimizer:
         logger.warning(f"⚠️ {bat_device.name}: Using fallback SOC 50%")
         return 50.0
 
-    def _extract_times(self, schedule, device_key, horizon_start, slot_minutes):
-        """Extract time slots for a device from schedule.
+    def _extract_slots(self, schedule, device_key, horizon_start, slot_minutes):
+        """Extract slot indices for a device from schedule.
         
-        Expands merged blocks back into individual slot times.
+        Expands merged blocks back into individual slot indices relative to horizon_start.
         Returns all slots (past and future) - filtering is done by limit_battery_cycles.
         """
-        times = []
+        slots = []
+        slot_delta = timedelta(minutes=slot_minutes)
+        one_minute = timedelta(minutes=1)
         
         for entry in schedule:
             if entry.get('device') == device_key:
                 start = datetime.fromisoformat(entry['start'])
                 stop = datetime.fromisoformat(entry['stop'])
                 
-                # Expand merged blocks into individual slots
-                current = start
-                slot_delta = timedelta(minutes=slot_minutes)
+                # Expand merged blocks into individual slots with integer minute offsets
+                # from the horizon start: ceil((stop - start) / slot) slots, skipping
+                # those before the horizon
+                start_minutes = (start - horizon_start) // one_minute
+                n_slots = -((start - stop) // slot_delta)
+                first_slot = max(0, -(start_minutes // slot_minutes))
                 
-                while current < stop:
-                    # Convert to HH:MM format relative to horizon
-                    minutes_from_horizon = int((current - horizon_start).total_seconds() / 60)
-                    if minutes_from_horizon >= 0:  # Only include slots within the horizon
-                        times.append(f"{minutes_from_horizon // 60:02d}:{minutes_from_horizon % 60:02d}")
-                    current += slot_delta
+                slots.extend(
+                    minutes_from_horizon // slot_minutes
+                    for minutes_from_horizon in range(start_minutes + first_slot * slot_minutes,
+                                                      start_minutes + n_slots * slot_minutes,
+                                                      slot_minutes)
+                )
         
-        return times
+        return slots
+
+    def _slots_to_schedule(self, slots, device_key, horizon_start, slot_minutes):
+        """Convert slot indices to merged ISO schedule entries."""
+        return slot_indices_to_merged_iso_ranges(slots, device_key, horizon_start, slot_minutes, slot_minutes)
 
-    def _times_to_schedule(self, times, device_key, horizon_start, slot_minutes):
-        """Convert time strings to ISO schedule entries."""
-        return slots_to_iso_ranges(
-            times, device_key, horizon_start.date(), horizon_start, block_minutes=slot_minutes
-        ) if times else []
+    def _get_predictor(self):
+        """Return the shared Prediction instance, creating it on first use."""
+        if self._predictor is None:
+            access_token = self.ha_client.get_access_token()
+            self._predictor = Prediction(StatisticsLoader(access_token), Weather(access_token),
+                                         self.price_history_manager)
+        return self._predictor
 
     async def _calculate_and_cache_predictions(self):
         """Run full ML predictions for power usage and solar production, writing results to TinyDB.
@@ -664,10 +798,7 @@ class HeatpumpOptimizer:
         """
         logger.info("🤖 Calculating and caching production & consumption predictions...")
         
-        access_token = self.ha_client.get_access_token()
-        stats_loader = StatisticsLoader(access_token)
-        weather = Weather(access_token)
-        predictor = Prediction(stats_loader, weather, self.price_history_manager)
+        predictor = self._get_predictor()
         
         try:
             await predictor.calculatePowerUsage()
@@ -1,6 +1,8 @@
 import logging
 import asyncio
+import bisect
 from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
 from entsoe import EntsoePandasClient
 
@@ -27,6 +29,13 @@ class EntsoeePriceFetcher:
         self.client = EntsoePandasClient(api_token)
         self.retry_interval_minutes = retry_interval_minutes
         self.retry_max_hours = retry_max_hours
+        # Last successful horizon, keyed by (slot start, lock_hours): reruns within the
+        # same slot get the same horizon, so they skip the ENTSO-E request
+        self._horizon_cache_key = None
+        self._horizon_cache = None
+        # ENTSO-E prices (EUR/kWh) from yesterday through tomorrow as (today, series),
+        # kept once tomorrow's prices are published since day-ahead prices don't change
+        self._day_prices_cache = None
 
     def get_horizon_prices(self, horizon_start=None, lock_hours=2):
         """Fetch prices for a rolling horizon from now until end of tomorrow.
@@ -36,6 +45,7 @@ class EntsoeePriceFetcher:
         - Extends to end of tomorrow (or as far as data is available)
         - Returns metadata about the horizon for constraint calculations
         - Automatically retries on failure (503 errors, etc.) based on configured intervals
+        - Reuses the last result while the horizon starts in the same slot
         
         Args:
             horizon_start: datetime for horizon start (defaults to now)
@@ -50,11 +60,21 @@ class EntsoeePriceFetcher:
                 'slot_minutes': Minutes per slot (15 minutes)
             Returns None if all retry attempts fail
         """
+        now = horizon_start or datetime.now()
+        cache_key = (now.replace(minute=(now.minute // SLOT_MINUTES) * SLOT_MINUTES, second=0, microsecond=0),
+                     lock_hours)
+        if cache_key == self._horizon_cache_key:
+            logger.info(f"♻️ Reusing ENTSO-E horizon prices fetched for slot {cache_key[0].strftime('%Y-%m-%d %H:%M')}")
+            return self._horizon_cache
+        
         max_attempts = (self.retry_max_hours * 60) // self.retry_interval_minutes
         
         for attempt in range(1, int(max_attempts) + 1):
             result = self._fetch_prices(horizon_start, lock_hours, attempt, int(max_attempts))
             if result is not None:
+                # Key by the slot the horizon was built for, which moves on during retries
+                self._horizon_cache_key = (result['horizon_start'], lock_hours)
+                self._horizon_cache = result
                 return result
             
             # If fetch failed and we have more attempts, wait before retry
@@ -66,6 +86,39 @@ class EntsoeePriceFetcher:
         logger.error(f"❌ Failed to fetch prices after {int(max_attempts)} attempts over {self.retry_max_hours} hours")
         return None
     
+    @staticmethod
+    def _slot_prices(prices_series, start, end):
+        """Look up the price of every slot from start (inclusive) to end (exclusive).
+        
+        Slots are looked up with two reindex calls instead of one timestamp lookup
+        per slot. A slot without its own price (hourly data) uses the price of
+        its hour, and slots without either are left out.
+        
+        Args:
+            prices_series: Prices indexed by tz-aware timestamps
+            start: Naive local datetime of the first slot
+            end: Naive local datetime where the slots end
+            
+        Returns:
+            Tuple of (naive slot start datetimes, prices) of the slots with a price
+        """
+        prices_series = prices_series[~prices_series.index.duplicated(keep='first')]
+        slots = pd.date_range(start, end, freq=f"{SLOT_MINUTES}min", inclusive='left')
+        # Localize like pd.Timestamp(naive, tz=...): on the autumn DST day the repeated
+        # wall times take their first (summer time) occurrence, and on the spring DST
+        # day the skipped wall times are shifted forward by the missing hour
+        localize = dict(ambiguous=np.ones(len(slots), dtype=bool), nonexistent=pd.Timedelta(hours=1))
+        slot_prices = prices_series.reindex(
+            slots.tz_localize('Europe/Brussels', **localize)
+        ).to_numpy(dtype=np.float64, copy=True)
+        missing = np.isnan(slot_prices)
+        if missing.any():
+            # If 15-minute data not available, use hourly price for this slot
+            hour_prices = prices_series.reindex(slots.floor('h').tz_localize('Europe/Brussels', **localize))
+            slot_prices[missing] = hour_prices.to_numpy(dtype=np.float64)[missing]
+        found = ~np.isnan(slot_prices)
+        return slots[found].to_pydatetime().tolist(), slot_prices[found].tolist()
+
     def _fetch_prices(self, horizon_start, lock_hours, attempt, max_attempts):
         """Internal method to fetch prices (single attempt).
         
@@ -81,7 +134,6 @@ class EntsoeePriceFetcher:
         try:
             if attempt > 1:
                 logger.info(f"🔄 Retry attempt {attempt}/{max_attempts}")
-            logger.info(f"🔎 Fetching horizon prices from ENTSO-E for {self.country_code}...")
             
             now = horizon_start or datetime.now()
             # Round down to current 15-minute slot
@@ -94,46 +146,47 @@ class EntsoeePriceFetcher:
             tomorrow_start = today_start + timedelta(days=1)
             tomorrow_end = tomorrow_start + timedelta(days=1)
             
-            # Fetch prices from yesterday through tomorrow
-            # We need yesterday's prices to preserve discharge decisions that were based on
-            # cheap prices from yesterday (e.g., yesterday 23:00 charge, today afternoon discharge)
-            start = pd.Timestamp(yesterday_start, tz='Europe/Brussels')
-            end = pd.Timestamp(tomorrow_end, tz='Europe/Brussels')
-            
-            # Query day-ahead prices
-            prices_series = self.client.query_day_ahead_prices(
-                self.country_code, 
-                start=start, 
-                end=end
-            )
-            
-            if prices_series is None or len(prices_series) == 0:
-                logger.error("⚠️ No price data returned from ENTSO-E")
-                return None
-            
-            # Convert to EUR/kWh (ENTSO-E returns EUR/MWh)
-            prices_series = prices_series / 1000.0
-            
-            logger.info(f"📊 Received {len(prices_series)} price points from ENTSO-E")
-            
-            # Build the horizon: from current slot to end of tomorrow in 15-minute intervals
-            horizon_prices = []
-            horizon_datetimes = []
-            
-            current_slot = current_slot_start
-            while current_slot < tomorrow_end:
-                slot_ts = pd.Timestamp(current_slot, tz='Europe/Brussels')
-                # Find the price for this slot (may need to look up the hour if data is hourly)
-                if slot_ts in prices_series.index:
-                    horizon_prices.append(prices_series[slot_ts])
-                    horizon_datetimes.append(current_slot)
-                else:
-                    # If 15-minute data not available, use hourly price for this slot
-                    hour_ts = pd.Timestamp(current_slot.replace(minute=0), tz='Europe/Brussels')
-                    if hour_ts in prices_series.index:
-                        horizon_prices.append(prices_series[hour_ts])
-                        horizon_datetimes.append(current_slot)
-                current_slot += timedelta(minutes=SLOT_MINUTES)
+            if self._day_prices_cache is not None and self._day_prices_cache[0] == today_start:
+                prices_series = self._day_prices_cache[1]
+                logger.info(f"♻️ Reusing ENTSO-E prices for {self.country_code} through {tomorrow_start.strftime('%Y-%m-%d')}")
+            else:
+                logger.info(f"🔎 Fetching horizon prices from ENTSO-E for {self.country_code}...")
+                
+                # Fetch prices from yesterday through tomorrow
+                # We need yesterday's prices to preserve discharge decisions that were based on
+                # cheap prices from yesterday (e.g., yesterday 23:00 charge, today afternoon discharge)
+                start = pd.Timestamp(yesterday_start, tz='Europe/Brussels')
+                end = pd.Timestamp(tomorrow_end, tz='Europe/Brussels')
+                
+                # Query day-ahead prices
+                prices_series = self.client.query_day_ahead_prices(
+                    self.country_code, 
+                    start=start, 
+                    end=end
+                )
+                
+                if prices_series is None or len(prices_series) == 0:
+                    logger.error("⚠️ No price data returned from ENTSO-E")
+                    return None
+                
+                # Convert to EUR/kWh (ENTSO-E returns EUR/MWh)
+                prices_series = prices_series / 1000.0
+                
+                logger.info(f"📊 Received {len(prices_series)} price points from ENTSO-E")
+                
+                # Once tomorrow's last hour is published nothing changes until midnight
+                if prices_series.index.max() >= end - pd.Timedelta(hours=1):
+                    self._day_prices_cache = (today_start, prices_series)
+            
+            # Look up every slot from yesterday 00:00 to end of tomorrow once; the horizon
+            # (from current slot to end of tomorrow) is the tail of these slots.
+            # Yesterday's prices are kept for the reference price stats used by battery
+            # discharge threshold calculations, to preserve discharge decisions that were
+            # based on cheap prices from yesterday (e.g., yesterday 23:00 charge → today afternoon discharge)
+            reference_datetimes, reference_prices = self._slot_prices(prices_series, yesterday_start, tomorrow_end)
+            horizon_offset = bisect.bisect_left(reference_datetimes, current_slot_start)
+            horizon_datetimes = reference_datetimes[horizon_offset:]
+            horizon_prices = reference_prices[horizon_offset:]
             
             if not horizon_prices:
                 logger.error("⚠️ No prices available for the horizon")
@@ -144,21 +197,6 @@ class EntsoeePriceFetcher:
             
             horizon_end = horizon_datetimes[-1] + timedelta(minutes=SLOT_MINUTES) if horizon_datetimes else current_slot_start
             
-            # Calculate reference price stats for battery discharge threshold calculations
-            # Include yesterday's prices to preserve discharge decisions that were based on
-            # cheap prices from yesterday (e.g., yesterday 23:00 charge → today afternoon discharge)
-            reference_prices = []
-            ref_slot = yesterday_start  # Start from yesterday 00:00
-            while ref_slot < tomorrow_end:
-                slot_ts = pd.Timestamp(ref_slot, tz='Europe/Brussels')
-                if slot_ts in prices_series.index:
-                    reference_prices.append(prices_series[slot_ts])
-                else:
-                    hour_ts = pd.Timestamp(ref_slot.replace(minute=0), tz='Europe/Brussels')
-                    if hour_ts in prices_series.index:
-                        reference_prices.append(prices_series[hour_ts])
-                ref_slot += timedelta(minutes=SLOT_MINUTES)
-            
             # Use min from yesterday+today+tomorrow for discharge threshold reference
             full_day_min_price = min(reference_prices) if reference_prices else min(horizon_prices)
             full_day_max_price = max(reference_prices) if reference_prices else max(horizon_prices)
@@ -16,6 +16,8 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple
 from tinydb import TinyDB, Query
 
+from .json_storage import FastJSONStorage
+
 logger = logging.getLogger(__name__)
 
 
@@ -80,7 +82,7 @@ class RuntimeCalculator:
             logger.info(f"📊 {device_name}: Expected daily runtime = {expected_daily_runtime:.2f} hours")
             
             # Store in database
-            with TinyDB('db.json') as db:
+            with TinyDB('db.json', storage=FastJSONStorage) as db:
                 runtime_table = db.table('wp_daily_runtime')
                 runtime_table.upsert(
                     {
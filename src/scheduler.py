@@ -2,24 +2,27 @@ import logging
 import json
 from datetime import datetime
 import asyncio
-from tinydb import TinyDB, Query
 from apscheduler.triggers.date import DateTrigger
 
+from .state_store import StateStore
+
 logger = logging.getLogger(__name__)
 
 
 class Scheduler:
-    """Manages scheduling of device actions using APScheduler and TinyDB."""
+    """Manages scheduling of device actions using APScheduler and the schedule store."""
 
-    def __init__(self, scheduler, devices):
+    def __init__(self, scheduler, devices, state_store: StateStore | None = None):
         """Initialize the Scheduler.
         
         Args:
             scheduler: APScheduler AsyncIOScheduler instance
             devices: Devices instance for executing actions
+            state_store: StateStore holding the schedule (opens the default store if None)
         """
         self.scheduler = scheduler
         self.devices = devices
+        self.state_store = state_store if state_store is not None else StateStore()
 
     def remove_device_jobs(self):
         """Remove only device-related scheduled jobs (jobs with '_device_' in their ID).
@@ -34,12 +37,11 @@ class Scheduler:
                 logger.debug(f"🗑️ Removed job: {job.id}")
 
     async def schedule_actions(self):
-        """Schedule device actions based on TinyDB schedule using APScheduler."""
-        with TinyDB('db.json') as db:
-            schedule_doc = db.get(Query().id == "schedule")
+        """Schedule device actions based on the stored schedule using APScheduler."""
+        schedule_doc = self.state_store.get("schedule")
         
         if not schedule_doc or "schedule" not in schedule_doc:
-            logger.warning("⚠️ No schedule found in TinyDB.")
+            logger.warning("⚠️ No schedule found in the state store.")
             return
 
         # Clear only device-related jobs in the scheduler
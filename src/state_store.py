@@ -0,0 +1,88 @@
+"""SQLite document store for optimizer state.
+
+Stores JSON documents keyed by id (the optimization schedule and the per-device
+``*_state`` documents) in a single SQLite table. TinyDB rewrites and re-parses
+the whole ``db.json`` file on every access; here a read or write only touches
+the document's row, and WAL mode lets the web server read while the optimizer
+writes.
+"""
+import logging
+import sqlite3
+import threading
+
+from .utils import json_dumps, json_loads
+
+logger = logging.getLogger(__name__)
+
+STATE_DB_PATH = 'state.db'
+
+
+class StateStore:
+    """JSON documents keyed by id in a SQLite table."""
+
+    def __init__(self, db_path: str = STATE_DB_PATH):
+        """Open (and create if needed) the state database.
+
+        Args:
+            db_path: Path to the SQLite database file
+        """
+        self.db_path = db_path
+        # One connection per store, shared between the scheduler's threads
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS kv (id TEXT PRIMARY KEY, doc TEXT NOT NULL)")
+
+    def get(self, doc_id: str) -> dict | None:
+        """Return the document with the given id, or None if it does not exist."""
+        with self._lock:
+            row = self._conn.execute("SELECT doc FROM kv WHERE id = ?", (doc_id,)).fetchone()
+        return json_loads(row[0]) if row else None
+
+    def get_many(self, doc_ids: list[str]) -> dict[str, dict]:
+        """Return the existing documents among doc_ids, keyed by id, in one query."""
+        if not doc_ids:
+            return {}
+        placeholders = ", ".join("?" * len(doc_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, doc FROM kv WHERE id IN ({placeholders})", list(doc_ids)
+            ).fetchall()
+        return {doc_id: json_loads(doc) for doc_id, doc in rows}
+
+    def upsert(self, doc: dict):
+        """Insert or replace a document, keyed by its ``id`` field."""
+        payload = json_dumps(doc)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO kv (id, doc) VALUES (?, ?)", (doc['id'], payload))
+
+    def upsert_many(self, docs: list[dict]):
+        """Insert or replace several documents in one transaction."""
+        rows = [(doc['id'], json_dumps(doc)) for doc in docs]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO kv (id, doc) VALUES (?, ?)", rows)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def update(self, doc: dict) -> bool:
+        """Replace an existing document, keyed by its ``id`` field.
+
+        Returns:
+            True if the document existed and was replaced, False otherwise
+        """
+        payload = json_dumps(doc)
+        with self._lock:
+            cursor = self._conn.execute("UPDATE kv SET doc = ? WHERE id = ?", (payload, doc['id']))
+        return cursor.rowcount > 0
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
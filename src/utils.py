@@ -4,9 +4,38 @@ from collections import defaultdict
 import ast
 import re
 import math
+import json
+
+# orjson serializes the schedule documents several times faster than the json
+# module, but is optional so the add-on still runs without it
+try:
+    import orjson
+    HAVE_ORJSON = True
+except ImportError:
+    orjson = None
+    HAVE_ORJSON = False
 
 logger = logging.getLogger(__name__)
 
+
+def json_dumps(obj) -> str:
+    """Serialize obj to a JSON string, using orjson when available."""
+    if orjson is not None:
+        # Non-string keys are converted to strings like the json module does
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj)
+
+
+def json_loads(data):
+    """Parse a JSON string, using orjson when available."""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # Files written by the json module may contain NaN/Infinity, which orjson rejects
+            pass
+    return json.loads(data)
+
 def ensure_list(value):
     """Ensure value is a list."""
     if isinstance(value, list):
@@ -214,6 +243,38 @@ def slots_to_iso_ranges(times, device, target_date, horizon_start=None, block_mi
     return ranges
 
 
+def slot_indices_to_merged_iso_ranges(slots, device, horizon_start, slot_minutes, block_minutes):
+    """Return merged {device, start, stop} ISO ranges for slot indices relative to horizon_start.
+
+    Single-pass equivalent of slots_to_iso_ranges followed by
+    merge_sequential_timeslots for one device: blocks starting where the previous
+    block stops are coalesced while walking the sorted slots, in integer minutes,
+    so no per-block dicts are built and no ISO strings are parsed back.
+
+    Args:
+        slots: Start slot indices relative to horizon_start
+        device: Device name
+        horizon_start: Datetime of slot 0
+        slot_minutes: Duration of each slot in minutes
+        block_minutes: Duration of each block in minutes
+    """
+    ranges = []
+    run_start = run_stop = None
+    for slot in sorted(slots):
+        start = slot * slot_minutes
+        if start != run_stop:
+            if run_start is not None:
+                ranges.append((run_start, run_stop))
+            run_start = start
+        run_stop = start + block_minutes
+    if run_start is not None:
+        ranges.append((run_start, run_stop))
+    return [{ "device": device,
+              "start": (horizon_start + timedelta(minutes=start)).isoformat(),
+              "stop": (horizon_start + timedelta(minutes=stop)).isoformat() }
+            for start, stop in ranges]
+
+
 from datetime import datetime
 from collections import defaultdict
 
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Regression test: the battery cycle limiter against the original algorithm's output."""
+
+import math
+import os
+import sys
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.config import CONFIG
+from src.optimization.battery_limiter import limit_battery_cycles
+
+SLOT_MINUTES = 15
+
+
+def _prices(n_slots):
+    """Day-like price curve with two cheap and two expensive periods."""
+    return [round(0.12 + 0.1 * math.sin(i / 8) + 0.03 * math.cos(i / 3), 4) for i in range(n_slots)]
+
+
+def _predictions(horizon_start, values):
+    """Per-slot predictions in the format produced by the forecaster."""
+    return [
+        {'timestamp': (horizon_start + timedelta(minutes=SLOT_MINUTES * i)).isoformat(), 'predicted_kwh': kwh}
+        for i, kwh in enumerate(values)
+    ]
+
+
+def scenarios():
+    """Yield (name, limit_battery_cycles kwargs) for the fixed regression scenarios."""
+    now = datetime.now().replace(second=0, microsecond=0)
+    # Horizon an hour ahead: every slot is in the future
+    future_start = now + timedelta(hours=1)
+    # Horizon two hours back (slot aligned): slots 0-7 are in the past
+    past_start = now.replace(minute=now.minute // SLOT_MINUTES * SLOT_MINUTES) - timedelta(hours=2)
+    prices = _prices(96)
+    common = dict(slot_minutes=SLOT_MINUTES, battery_capacity_kwh=10.0, battery_charge_speed_kw=3.0,
+                  min_soc_percent=10.0, max_soc_percent=90.0)
+    charge = [i for i in range(96) if prices[i] < 0.08]
+    discharge = [i for i in range(96) if prices[i] > 0.17]
+    usage = [0.3 + 0.4 * (i % 5 == 0) for i in range(96)]
+
+    yield "nearly empty battery", dict(
+        common, charge_slots=charge, discharge_slots=discharge, horizon_start=future_start,
+        current_soc=15.0, prices=prices, predicted_power_usage=_predictions(future_start, usage))
+    yield "nearly full battery", dict(
+        common, charge_slots=charge, discharge_slots=discharge, horizon_start=future_start,
+        current_soc=85.0, prices=prices, predicted_power_usage=_predictions(future_start, usage))
+    yield "prices only, no usage forecast", dict(
+        common, charge_slots=charge, discharge_slots=discharge, horizon_start=future_start,
+        current_soc=50.0, prices=prices)
+    yield "unknown SOC, no prices", dict(
+        common, charge_slots=charge[:12], discharge_slots=discharge[:12], horizon_start=future_start,
+        current_soc=None, prices=None)
+    yield "half battery with usage and solar", dict(
+        common, charge_slots=charge, discharge_slots=discharge, horizon_start=future_start,
+        current_soc=50.0, prices=prices,
+        predicted_power_usage=_predictions(future_start, [0.2 + 0.3 * (i % 7 == 0) for i in range(96)]),
+        predicted_solar=_predictions(future_start, [max(0.0, 0.8 * math.sin((i - 24) / 15)) for i in range(96)]))
+    yield "conflicting slots, partial prices", dict(
+        common, charge_slots=charge + discharge[:3], discharge_slots=discharge, horizon_start=future_start,
+        current_soc=40.0, prices=prices[:48], predicted_power_usage=_predictions(future_start, usage))
+    yield "past slots kept from the previous schedule", dict(
+        common, charge_slots=[0, 2, 3] + [s for s in charge if s >= 10],
+        discharge_slots=[1, 4] + [s for s in discharge if s >= 10],
+        previous_limited_charge_slots=[0, 5], previous_limited_discharge_slots=[6],
+        horizon_start=past_start, current_soc=30.0, prices=prices,
+        predicted_power_usage=_predictions(past_start, [0.25] * 96))
+
+
+# Output of the original HH:MM string based limiter (before the slot index and
+# Numba rewrites) for each scenario, as (charge slots, discharge slots)
+BASELINE_RESULTS = {
+    "nearly empty battery": (
+        [],
+        [17, 59],
+    ),
+    "nearly full battery": (
+        [30, 31, 32, 33, 34, 42, 43, 44, 45, 82, 83, 84, 85, 86, 87, 88, 89, 90],
+        [3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 54, 55, 56, 57, 58, 59, 60, 61, 62, 63, 64, 65, 66, 67, 68, 69, 70, 71, 72, 73],
+    ),
+    "prices only, no usage forecast": (
+        [83, 84, 85, 86, 87, 88],
+        [3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 54, 55, 56, 57, 58, 59, 60, 61, 62, 63, 64, 65, 66, 67, 68, 69, 70, 71, 72, 73],
+    ),
+    "unknown SOC, no prices": (
+        [27, 28, 29, 30, 31, 32, 33, 34, 35, 36, 37, 38],
+        [],
+    ),
+    "half battery with usage and solar": (
+        [86],
+        [3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 54, 55, 56, 57, 58, 59, 60, 61, 62, 63, 64, 65, 66, 67, 68, 69, 70, 71, 72, 73],
+    ),
+    "conflicting slots, partial prices": (
+        [30, 31, 32, 33, 34, 41, 42, 43, 44, 45, 46, 80, 81, 82],
+        [9, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 54, 55, 56, 57, 58, 59, 60, 61, 62, 63, 64, 65, 66, 67, 68, 69, 70, 71, 72, 73],
+    ),
+    "past slots kept from the previous schedule": (
+        [0, 5, 85, 86, 87],
+        [6, 15, 16, 17, 18, 19, 57, 58, 59, 60, 61],
+    ),
+}
+
+def test_limiter_matches_baseline():
+    """Limited charge/discharge slots must match the original algorithm on fixed scenarios."""
+    options = CONFIG.setdefault('options', {})
+    saved = {key: options.get(key) for key in ('battery_charge_buffer_percent', 'battery_discharge_buffer_percent')}
+    options.update(battery_charge_buffer_percent=20, battery_discharge_buffer_percent=20)
+    try:
+        for name, kwargs in scenarios():
+            expected_charge, expected_discharge = BASELINE_RESULTS[name]
+            charge, discharge = limit_battery_cycles(**kwargs, device_name=name)
+            assert charge == expected_charge, f"{name}: charge {charge} != baseline {expected_charge}"
+            assert discharge == expected_discharge, f"{name}: discharge {discharge} != baseline {expected_discharge}"
+            print(f"✓ {name}: {len(charge)} charge, {len(discharge)} discharge slots")
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                options.pop(key, None)
+            else:
+                options[key] = value
+
+
+if __name__ == "__main__":
+    test_limiter_matches_baseline()
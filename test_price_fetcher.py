@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Test slot price lookup of the ENTSO-E price fetcher across DST transitions."""
+
+import os
+import sys
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+
+from src.price_fetcher import EntsoeePriceFetcher, SLOT_MINUTES
+
+TZ = 'Europe/Brussels'
+
+# Autumn (repeated 02:00-03:00) and spring (skipped 02:00-03:00) DST days in Brussels
+DST_DAYS = [datetime(2026, 10, 25), datetime(2026, 3, 29)]
+
+
+def _entsoe_series(start, end, freq):
+    """Prices as returned by ENTSO-E: a tz-aware index over real time, EUR/kWh."""
+    index = pd.date_range(pd.Timestamp(start, tz=TZ), pd.Timestamp(end, tz=TZ), freq=freq, inclusive='left')
+    return pd.Series(np.round(0.05 + 0.001 * np.arange(len(index)), 4), index=index)
+
+
+def _per_slot_prices(prices_series, start, end):
+    """Reference: look up every slot with its own tz-aware timestamp, falling back to its hour."""
+    datetimes, prices = [], []
+    slot = start
+    while slot < end:
+        slot_ts = pd.Timestamp(slot, tz=TZ)
+        if slot_ts in prices_series.index:
+            datetimes.append(slot)
+            prices.append(prices_series[slot_ts])
+        else:
+            hour_ts = pd.Timestamp(slot.replace(minute=0), tz=TZ)
+            if hour_ts in prices_series.index:
+                datetimes.append(slot)
+                prices.append(prices_series[hour_ts])
+        slot += timedelta(minutes=SLOT_MINUTES)
+    return datetimes, prices
+
+
+def test_slot_prices_across_dst():
+    """Slot prices on and around DST days match the per-slot timestamp lookup."""
+    for dst_day in DST_DAYS:
+        for freq in (f"{SLOT_MINUTES}min", "h"):
+            # Yesterday through tomorrow, as fetched on the day before, of and after the DST change
+            for today in (dst_day - timedelta(days=1), dst_day, dst_day + timedelta(days=1)):
+                start, end = today - timedelta(days=1), today + timedelta(days=2)
+                series = _entsoe_series(start, end, freq)
+                datetimes, prices = EntsoeePriceFetcher._slot_prices(series, start, end)
+                expected_datetimes, expected_prices = _per_slot_prices(series, start, end)
+                assert datetimes == expected_datetimes, f"{today:%Y-%m-%d} ({freq}): slot times differ"
+                assert prices == expected_prices, f"{today:%Y-%m-%d} ({freq}): slot prices differ"
+                print(f"✓ {today:%Y-%m-%d} ({freq} data): {len(datetimes)} slots")
+
+
+class _StubClient:
+    """Stands in for EntsoePandasClient, returning fixed prices in EUR/MWh."""
+
+    def __init__(self, series_mwh):
+        self.series_mwh = series_mwh
+
+    def query_day_ahead_prices(self, country_code, start, end):
+        return self.series_mwh
+
+
+def test_horizon_and_reference_split_across_dst():
+    """The horizon is the tail of the reference slots, also when either spans a DST change."""
+    for dst_day in DST_DAYS:
+        for now in (dst_day - timedelta(hours=5, minutes=10), dst_day + timedelta(hours=1, minutes=50),
+                    dst_day + timedelta(hours=13), dst_day + timedelta(days=1, hours=8, minutes=20)):
+            today = now.replace(hour=0, minute=0)
+            yesterday_start, tomorrow_end = today - timedelta(days=1), today + timedelta(days=2)
+            series_mwh = _entsoe_series(yesterday_start, tomorrow_end, f"{SLOT_MINUTES}min") * 1000.0
+            fetcher = EntsoeePriceFetcher('test-token', 'BE')
+            fetcher.client = _StubClient(series_mwh)
+            series = series_mwh / 1000.0
+
+            result = fetcher._fetch_prices(now, lock_hours=2, attempt=1, max_attempts=1)
+            assert result is not None, f"{now}: no horizon"
+
+            current_slot_start = now.replace(minute=now.minute // SLOT_MINUTES * SLOT_MINUTES)
+            horizon_datetimes, horizon_prices = _per_slot_prices(series, current_slot_start, tomorrow_end)
+            _, reference_prices = _per_slot_prices(series, yesterday_start, tomorrow_end)
+            assert result['horizon_start'] == current_slot_start
+            assert result['prices'] == horizon_prices, f"{now}: horizon prices differ"
+            assert result['horizon_end'] == horizon_datetimes[-1] + timedelta(minutes=SLOT_MINUTES)
+            assert result['lock_end_slot'] == min(2 * 60 // SLOT_MINUTES, len(horizon_prices))
+            assert result['full_day_min_price'] == min(reference_prices)
+            assert result['full_day_max_price'] == max(reference_prices)
+            print(f"✓ {now:%Y-%m-%d %H:%M}: {len(horizon_prices)} horizon slots, {len(reference_prices)} reference slots")
+
+
+if __name__ == "__main__":
+    test_slot_prices_across_dst()
+    test_horizon_and_reference_split_across_dst()
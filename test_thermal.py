@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Parity test for the thermal scheduler: dynamic program vs. MILP (CBC)."""
+
+import os
+import random
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pulp
+
+from src.optimization.thermal import _solve_dp, _solve_milp
+
+
+def violated_constraint(starts, n_slots, block_len, min_gap_slots, max_gap_slots, locked_slots, initial_gap_slots):
+    """Check a schedule against the MILP constraints, return the first violated one or None."""
+    n_starts = n_slots - block_len + 1
+    if any(s < 0 or s >= n_starts for s in starts):
+        return "start out of range"
+    ordered = sorted(starts)
+    if any(b - a < block_len + min_gap_slots for a, b in zip(ordered, ordered[1:])):
+        return "overlap / min gap"
+    remaining_allowed_gap = max(0, max_gap_slots - initial_gap_slots)
+    if remaining_allowed_gap < n_starts and not any(s <= remaining_allowed_gap for s in starts):
+        return "initial gap"
+    window_size = max_gap_slots + block_len
+    for window_start in range(0, n_slots - window_size + 1):
+        if not any(window_start - block_len < s < window_start + window_size for s in starts):
+            return f"max gap window at {window_start}"
+    if any(0 <= s < n_starts and s not in starts for s in locked_slots):
+        return "locked slot"
+    return None
+
+
+def random_instance(rng):
+    """Draw a random scheduling instance, biased towards edge cases."""
+    n_slots = rng.randint(1, 60)
+    block_len = rng.randint(1, 4)
+    min_gap_slots = rng.choice([0, 0, 1, 3])
+    max_gap_slots = rng.choice([0, 1, 4, 8, 16, 80])
+    initial_gap_slots = rng.choice([0, rng.randint(0, 20), max_gap_slots, max_gap_slots + 5])
+    prices = [round(rng.uniform(-0.05, 0.4), 4) for _ in range(n_slots)]
+    # Locked starts may lie past the last valid start or be too close together
+    locked_slots = set(rng.sample(range(n_slots + 3), rng.choice([0, 0, 1, 2, 3])))
+    return prices, n_slots, block_len, min_gap_slots, max_gap_slots, locked_slots, initial_gap_slots
+
+
+def test_dp_matches_milp():
+    """The DP must be feasible exactly when the MILP is and reach the same cost."""
+    rng = random.Random(20240601)
+    solver = pulp.PULP_CBC_CMD(msg=0)
+    n_feasible = 0
+
+    for case in range(300):
+        prices, n_slots, block_len, min_gap_slots, max_gap_slots, locked_slots, initial_gap_slots = random_instance(rng)
+        if n_slots < block_len:
+            continue
+        args = (n_slots, block_len, min_gap_slots, max_gap_slots, locked_slots, initial_gap_slots)
+        csum = np.concatenate(([0.0], np.cumsum(prices)))
+        window_costs = csum[block_len:] - csum[:len(csum) - block_len]
+
+        dp_starts = _solve_dp(window_costs, *args)
+        milp_starts = _solve_milp(window_costs.tolist(), *args, "test", solver)
+        milp_violation = violated_constraint(milp_starts, *args)
+
+        if dp_starts is None:
+            # Infeasible model: the MILP falls back to the locked slots, which break a constraint
+            assert milp_violation is not None, f"case {case}: DP infeasible but MILP found {milp_starts} for {args}"
+            continue
+
+        n_feasible += 1
+        dp_violation = violated_constraint(dp_starts, *args)
+        assert dp_violation is None, f"case {case}: DP schedule {dp_starts} violates {dp_violation} for {args}"
+        assert milp_violation is None, f"case {case}: DP feasible but MILP returned {milp_starts} for {args}"
+        dp_cost = sum(window_costs[s] for s in dp_starts)
+        milp_cost = sum(window_costs[s] for s in milp_starts)
+        assert abs(dp_cost - milp_cost) < 1e-6, (
+            f"case {case}: DP cost {dp_cost:.6f} ({dp_starts}) != MILP cost {milp_cost:.6f} ({milp_starts}) for {args}")
+
+    print(f"DP and MILP agree on all instances ({n_feasible} feasible)")
+
+
+if __name__ == "__main__":
+    test_dp_matches_milp()
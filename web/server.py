@@ -3,6 +3,8 @@ from flask_cors import CORS
 import json
 from datetime import datetime, timedelta
 import logging
+import sqlite3
+from contextlib import closing
 from tinydb import TinyDB, Query
 import plotly.express as px
 import plotly.graph_objects as go
@@ -18,24 +20,39 @@ CORS(app)
 with open('config.json', 'r') as f:
     CONFIG = json.load(f)
 
+# Schedule written by the optimizer (see src/state_store.py); read directly so the
+# web server does not import the optimizer package
+STATE_DB_PATH = 'state.db'
+
+
+def _schedule_docs():
+    """Return the stored schedule as a list of documents (empty if none)."""
+    try:
+        with closing(sqlite3.connect(STATE_DB_PATH)) as conn:
+            row = conn.execute("SELECT doc FROM kv WHERE id = ?", ('schedule',)).fetchone()
+    except sqlite3.OperationalError:
+        # Database or table not created yet (optimizer has not run)
+        return []
+    return [json.loads(row[0])] if row else []
+
 
 @app.route('/')
 def index():
     """Render main page"""
-    return render_template('index.html')
+    return render_template(
+        'index.html',
+        export_prediction_debug_csv=CONFIG.get('options', {}).get('export_prediction_debug_csv', False),
+    )
 
 @app.route('/api/results')
 def get_results():
     """Return optimizer results as JSON"""
-    with TinyDB('db.json') as db:
-        schedule_docs = db.search(Query().id == 'schedule')
-    return schedule_docs
+    return _schedule_docs()
 
 @app.route('/api/battery_thresholds')
 def get_battery_thresholds():
     """Return battery price thresholds"""
-    with TinyDB('db.json') as db:
-        schedule_docs = db.search(Query().id == 'schedule')
+    schedule_docs = _schedule_docs()
     
     if schedule_docs and 'battery_price_thresholds' in schedule_docs[0]:
         thresholds = schedule_docs[0]['battery_price_thresholds']
@@ -136,8 +153,8 @@ def get_predictions():
 @app.route('/api/gantt')
 def get_gantt():
     """Generate and return Plotly chart: Gantt schedule, price histogram, and power predictions sharing one x-axis"""
+    schedule_docs = _schedule_docs()
     with TinyDB('db.json') as db:
-        schedule_docs = db.search(Query().id == 'schedule')
         prediction_docs = db.search(Query().id == 'predictions')
 
     if not schedule_docs or not schedule_docs[0].get('schedule'):